@@ -0,0 +1,158 @@
+"""
+Per-day partial aggregates of a round.
+
+csv_miner.py writes, next to the day files, a small aggregate_DATE.csv with the
+per-author capped comment upvotes, comment counts, flair-weighted post upvotes
+and post counts of that day, the upvotes in whole units (see scoring.py).
+csv_generator.py then only merges those aggregates, recomputing a day when the
+content hash of one of its source files (or the scoring parameters) changed
+since its aggregate was written.
+"""
+import hashlib
+import json
+import os
+
+import pandas as pd
+
+import scoring
+from round_store import round_files
+
+
+MANIFEST = 'aggregates.json'
+SOURCES = ('posts', 'comments', 'daily')
+
+
+def file_hash(path):
+    """sha256 of the content of a file."""
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def params_fingerprint():
+    """Scoring parameters an aggregate depends on."""
+    return {'limit': scoring.COMMENT_LIMIT, 'daily_factor': scoring.DAILY_FACTOR, 'flair_weights': scoring.FLAIR_WEIGHTS,
+            'units': {'comment': scoring.COMMENT_UNITS, 'post': scoring.POST_UNITS}}
+
+
+def aggregate_path(round_dir, key):
+    return os.path.join(round_dir, 'aggregate_' + key + '.csv')
+
+
+def read_manifest(round_dir):
+    path = os.path.join(round_dir, MANIFEST)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def write_manifest(round_dir, manifest):
+    path = os.path.join(round_dir, MANIFEST)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(path + '.tmp', path)
+
+
+def source_hashes(files):
+    return {kind: file_hash(files[kind]) for kind in SOURCES if kind in files}
+
+
+def write_aggregate(round_dir, key, files, manifest=None, limited=True, index_rows=None):
+    """
+    Scores one day and stores its aggregate.
+
+    inputs:
+    round_dir [str]: round directory
+    key [str]: date key of the day
+    files [dict]: day files, as returned by round_store.round_files
+    manifest [dict]: manifest to update, read from round_dir when not given
+    limited [bool or str]: also write the _limited files of the day; 'mask' writes the included_DATE.csv mask instead
+    index_rows [dict]: if given, the round_index rows of the day are built from the scored frames and stored in it
+    output: per-author totals of the day, in units [DataFrame]
+    """
+    save = manifest is None
+    if save:
+        manifest = read_manifest(round_dir)
+    totals, capped, posts = scoring.score_day(files)
+    if limited:
+        scoring.write_limited(files, capped, 'mask' if limited == 'mask' else 'copy')
+    if index_rows is not None:
+        from round_index import day_rows
+        index_rows[key] = day_rows(key, files, capped, posts)
+    totals.rename_axis('author').to_csv(aggregate_path(round_dir, key))
+    manifest[key] = {'sources': source_hashes(files), 'params': params_fingerprint()}
+    if save:
+        write_manifest(round_dir, manifest)
+    return totals
+
+
+def read_aggregate(round_dir, key):
+    totals = pd.read_csv(aggregate_path(round_dir, key), index_col='author', keep_default_na=False,
+                         dtype={'comments': 'int64', 'comment_units': 'int64', 'posts': 'int64', 'post_units': 'int64'})
+    totals.index = totals.index.astype(str)
+    return totals
+
+
+def is_current(round_dir, key, files, manifest):
+    """Whether the stored aggregate of a day still matches its source files."""
+    entry = manifest.get(key)
+    if entry is None or not os.path.exists(aggregate_path(round_dir, key)):
+        return False
+    return entry['params'] == json.loads(json.dumps(params_fingerprint())) and entry['sources'] == source_hashes(files)
+
+
+def _aggregate_day(args):
+    """Process-pool worker: scores one day and returns its totals, manifest entry and index rows."""
+    round_dir, key, files, limited, index = args
+    manifest = {}
+    index_rows = {} if index else None
+    totals = write_aggregate(round_dir, key, files, manifest, limited, index_rows)
+    return totals, manifest[key], None if index_rows is None else index_rows[key]
+
+
+def round_aggregates(round_dir, days=None, limited=True, workers=1, index_rows=None):
+    """
+    Per-day totals of a round, recomputing only the days whose sources changed.
+
+    inputs:
+    round_dir [str]: round directory
+    days [dict]: day files, as returned by round_store.round_files
+    limited [bool or str]: write the _limited files of the recomputed days, or their included_DATE.csv mask with 'mask'
+    workers [int]: processes scoring the changed days in parallel. Default is 1, i.e. one day after the other.
+    index_rows [dict]: if given, filled with the round_index rows of the days scored again, see round_index.update_index
+    output: {date_key: per-author totals in units [DataFrame]}, in date key order
+    """
+    if days is None:
+        days = round_files(round_dir)
+    manifest = read_manifest(round_dir)
+    totals = {}
+    stale = []
+    for key in sorted(days):
+        if not any(kind in days[key] for kind in SOURCES):
+            continue
+        mode = ('mask' if limited == 'mask' else 'copy') if limited else None
+        missing = any(not os.path.exists(path) for path in scoring.limited_outputs(days[key], mode))
+        if not missing and is_current(round_dir, key, days[key], manifest):
+            totals[key] = read_aggregate(round_dir, key)
+        else:
+            stale.append(key)
+
+    # Days are independent until the per-user merge, so they can be scored on separate cores.
+    if workers > 1 and len(stale) > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=min(workers, len(stale))) as pool:
+            results = pool.map(_aggregate_day, [(round_dir, key, days[key], limited, index_rows is not None) for key in stale])
+            for key, (day_totals, entry, rows) in zip(stale, results):
+                totals[key] = day_totals
+                manifest[key] = entry
+                if index_rows is not None:
+                    index_rows[key] = rows
+    else:
+        for key in stale:
+            totals[key] = write_aggregate(round_dir, key, days[key], manifest, limited, index_rows)
+    if stale:
+        write_manifest(round_dir, manifest)
+    return {key: totals[key] for key in sorted(totals)}
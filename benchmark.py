@@ -0,0 +1,172 @@
+"""
+Benchmark of the round pipeline against local stand-ins.
+
+Generates a synthetic round and chain (see standins.py) of the given size and
+runs each entry point on it, reporting wall time, API requests by kind and,
+with --memory, peak traced memory. Nothing goes to the network.
+
+Run with: python benchmark.py [--users 500] [--days 7] [--posts 50] [--comments 3000] [--daily 2000]
+                              [--wallets 50] [--transfers 100] [--fmt csv] [--workers N] [--memory] [--json report.json]
+                              [--only generator,reddit,multipliers]
+
+The Reddit entries time the daily-thread harvest, the mention fetch, csv_miner
+and pay2post on one day, the single-client daily pipeline and the rescore
+lookups. Every entry fetches the comment trees again, as a separate run would.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+from collections import Counter
+
+from standins import SyntheticRound, SyntheticChain
+
+
+def measure(name, run, calls, memory=False):
+    before = Counter(calls)
+    if memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        run()
+    result = {'entry': name, 'seconds': round(time.perf_counter() - start, 4)}
+    if memory:
+        result['peak_mib'] = round(tracemalloc.get_traced_memory()[1] / 2**20, 2)
+        tracemalloc.stop()
+    result['api_calls'] = dict(Counter(calls) - before)
+    return result
+
+
+def generator_entries(world, workdir, fmt, memory, workers=1):
+    from csv_generator import csv_generator
+    from registry import WalletRegistry
+
+    round_dir = os.path.join(workdir, 'round')
+    world.write_round(round_dir, fmt)
+    registry = WalletRegistry(world.users_json(os.path.join(workdir, 'users.json')), offline=True)
+    calls = Counter()
+    return [
+        measure('csv_generator (cold)', lambda: csv_generator(round_dir, 1, registry), calls, memory),
+        measure('csv_generator (aggregates cached)', lambda: csv_generator(round_dir, 1, registry), calls, memory),
+        measure('csv_generator (compact)', lambda: csv_generator(round_dir, 1, registry, compact=True, index=False), calls, memory),
+        measure('csv_generator (streaming, 64 MiB)', lambda: csv_generator(round_dir, 1, registry, max_memory=64 * 2**20, index=False), calls, memory),
+    ] + ([
+        measure('csv_generator (compact, %d processes)' % workers, lambda: csv_generator(round_dir, 1, registry, compact=True, index=False, workers=workers), calls, memory),
+    ] if workers > 1 else [])
+
+
+def reddit_entries(world, workdir, fmt, memory):
+    from daily_harvest import harvest_daily
+    from mentions import new_mentions, append_pay2post
+    from rescore import rescore_round
+    from daily_pipeline import daily_pipeline
+    from csv_miner import csv_miner
+    from pay2post import pay2post
+    from round_store import day_key
+
+    reddit = world.reddit()
+    round_dir = os.path.join(workdir, 'mined')
+    os.makedirs(round_dir, exist_ok=True)
+    day = world.days[0]
+
+    def mentions():
+        rows, _ = new_mentions(reddit, None, world.start)
+        append_pay2post(rows, round_dir, world.start, fmt)
+
+    def cold(run):
+        def entry():
+            for submission in reddit.submissions:
+                submission.forest = None
+            run()
+        return entry
+
+    miner_dir = os.path.join(workdir, 'miner')
+    os.makedirs(os.path.join(miner_dir, '1'), exist_ok=True)
+    connect = lambda budget: reddit
+
+    rescore_dir = os.path.join(workdir, 'round')
+    if not os.path.isdir(rescore_dir):
+        world.write_round(rescore_dir, fmt)
+    return [
+        measure('daily thread harvest (1 day)', cold(lambda: harvest_daily(reddit, 'd' + day_key(day), round_dir, day_key(day), fmt)), world.calls, memory),
+        measure('pay2post mentions (round)', mentions, world.calls, memory),
+        measure('csv_miner + pay2post (1 day)',
+                cold(lambda: (csv_miner(miner_dir + '/', 'sub', 1, 0, len(world.days), fmt, connect=connect), pay2post(miner_dir + '/', 1, fmt, connect=connect))), world.calls, memory),
+        measure('daily pipeline (1 day + mentions, one client)',
+                cold(lambda: daily_pipeline(reddit, workdir, 'sub', 1, 0, len(world.days), fmt, round_dir=os.path.join(workdir, 'pipeline'))), world.calls, memory),
+        measure('rescore_round', lambda: rescore_round(rescore_dir, lambda: reddit, 4, os.path.join(workdir, 'rescored')), world.calls, memory),
+    ]
+
+
+def multiplier_entries(chain, wallets, workdir, memory):
+    import compute_multiplier as cm
+    from transfer_cache import TransferCache
+    from ledger import Ledger
+
+    restore = chain.install()
+    cache = TransferCache(os.path.join(workdir, 'transfers.sqlite'), fetch=cm.fetch_transfers)
+    ledger = Ledger(os.path.join(workdir, 'ledger.sqlite'))
+    nft_contracts = sorted({tx['contractAddress'] for tx in chain.tokennfttx})
+    try:
+        return [
+            measure('get_multiplier (per wallet)', lambda: [cm.get_multiplier(w) for w in wallets], chain.calls, memory),
+            measure('get_multipliers (batch)', lambda: cm.get_multipliers(wallets), chain.calls, memory),
+            measure('get_multipliers (transfer cache, cold)', lambda: cm.get_multipliers(wallets, cache), chain.calls, memory),
+            measure('get_multipliers (transfer cache, warm)', lambda: cm.get_multipliers(wallets, cache), chain.calls, memory),
+            measure('ledger sync + multipliers', lambda: (ledger.sync(nft_contracts), ledger.multipliers(wallets)), chain.calls, memory),
+        ]
+    finally:
+        restore()
+
+
+def report(results):
+    width = max(len(r['entry']) for r in results)
+    for r in results:
+        line = r['entry'].ljust(width) + '  %8.3f s' % r['seconds']
+        if 'peak_mib' in r:
+            line += '  %8.1f MiB' % r['peak_mib']
+        calls = ', '.join('%s=%d' % item for item in sorted(r['api_calls'].items()))
+        print(line + '  ' + (calls or 'no API calls'))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the round pipeline against local stand-ins.')
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--days', type=int, default=7)
+    parser.add_argument('--posts', type=int, default=50, help='submissions per day')
+    parser.add_argument('--comments', type=int, default=3000, help='comments per day')
+    parser.add_argument('--daily', type=int, default=2000, help='daily-thread comments per day')
+    parser.add_argument('--wallets', type=int, default=50)
+    parser.add_argument('--transfers', type=int, default=100, help='token transfers per wallet')
+    parser.add_argument('--fmt', default='csv', choices=['csv', 'parquet'])
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='processes for the parallel generator entry')
+    parser.add_argument('--memory', action='store_true', help='trace peak memory (slows the entries down)')
+    parser.add_argument('--only', default='generator,reddit,multipliers')
+    parser.add_argument('--json', help='also write the results to this file')
+    args = parser.parse_args()
+
+    only = args.only.split(',')
+    workdir = tempfile.mkdtemp(prefix='donut-bench-')
+    results = []
+    try:
+        world = SyntheticRound(args.users, args.days, args.posts, args.comments, args.daily, seed=args.seed)
+        if 'generator' in only:
+            results += generator_entries(world, workdir, args.fmt, args.memory, args.workers)
+        if 'reddit' in only:
+            results += reddit_entries(world, workdir, args.fmt, args.memory)
+        if 'multipliers' in only:
+            wallets = ['0x%040x' % (i + 1) for i in range(args.wallets)]
+            results += multiplier_entries(SyntheticChain(wallets, args.transfers, args.seed), wallets, workdir, args.memory)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report(results)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'params': vars(args), 'results': results}, f, indent=1)
@@ -0,0 +1,205 @@
+"""
+Compact in-memory representation of a round.
+
+Every author name is interned once into an integer id shared by the posts,
+comments, daily and pay2post files of the round. The day files are then held
+as fixed-width numpy arrays (int32 author ids and scores, int64 dates, int8
+flair codes) instead of frames of Python strings, and all group-bys are
+np.bincount calls over the author ids.
+"""
+import numpy as np
+import pandas as pd
+
+import scoring
+from round_store import read_day
+
+
+# Flair codes: the index in FLAIRS, -1 for any other flair (weight 1).
+FLAIRS = list(scoring.FLAIR_WEIGHTS)
+
+
+class Authors:
+    """Interned author names, each with a stable integer id."""
+
+    def __init__(self):
+        self.names = []
+        self.ids = {}
+
+    def __len__(self):
+        return len(self.names)
+
+    def intern(self, values):
+        """Ids of the given names, -1 for missing ones. New names are added."""
+        codes, uniques = pd.factorize(pd.Series(values, dtype=object))
+        lookup = np.empty(len(uniques), dtype=np.int32)
+        for i, name in enumerate(uniques):
+            name = str(name)
+            if name not in self.ids:
+                self.ids[name] = len(self.names)
+                self.names.append(name)
+            lookup[i] = self.ids[name]
+        return np.where(codes < 0, -1, lookup[codes]).astype(np.int32)
+
+    def lookup(self, names):
+        """Ids of the given names, -1 for names never interned."""
+        return np.array([self.ids.get(name, -1) for name in names], dtype=np.int32)
+
+
+def flair_codes(flair):
+    return flair.astype(object).map({f: i for i, f in enumerate(FLAIRS)}).fillna(-1).to_numpy().astype(np.int8)
+
+
+def dates(column):
+    # NaT sorts last, as in pandas.
+    values = column.to_numpy(dtype='datetime64[ns]').astype(np.int64)
+    return np.where(column.isna().to_numpy(), np.iinfo(np.int64).max, values)
+
+
+class CompactRound:
+    """
+    Posts, comments (daily thread included) and pay2post submissions of a round as interned arrays.
+
+    attributes:
+    authors [Authors]: author dictionary of the round
+    keys [list]: date keys of the days, `day` arrays index into it
+    posts [dict]: day, author, score, flair arrays
+    comments [dict]: day, author, score, date, daily arrays; each day holds its comments, then its daily-thread comments
+    pay2post [dict]: day, author arrays
+    """
+
+    def __init__(self, authors=None):
+        self.authors = Authors() if authors is None else authors
+        self.keys = []
+        self.posts = {'day': [], 'author': [], 'score': [], 'flair': []}
+        self.comments = {'day': [], 'author': [], 'score': [], 'date': [], 'daily': []}
+        self.pay2post = {'day': [], 'author': []}
+
+    @classmethod
+    def load(cls, days, authors=None, workers=1):
+        """
+        Reads the day files of a round.
+
+        inputs:
+        days [dict]: day files, as returned by round_store.round_files
+        authors [Authors]: dictionary to intern the names into, a new one if not given
+        workers [int]: processes reading the days in parallel; each returns a one-day CompactRound whose
+                       author ids are mapped into the round dictionary in date key order, so the result is
+                       the same as with one process
+        output: CompactRound
+        """
+        compact = cls(authors)
+        keys = sorted(days)
+        if workers > 1 and len(keys) > 1:
+            from concurrent.futures import ProcessPoolExecutor
+            with ProcessPoolExecutor(max_workers=min(workers, len(keys))) as pool:
+                for part in pool.map(_load_day, [(key, days[key]) for key in keys]):
+                    compact.merge(part)
+        else:
+            for key in keys:
+                compact.add_day(key, days[key])
+        compact.freeze()
+        return compact
+
+    def add_day(self, key, files):
+        day = len(self.keys)
+        self.keys.append(key)
+
+        posts = read_day(files.get('posts'), ['author', 'score', 'flair'], 'posts')
+        self.append(self.posts, day, self.authors.intern(posts['author']),
+                    score=posts['score'].to_numpy(dtype=np.int32), flair=flair_codes(posts['flair']))
+
+        for kind in ('comments', 'daily'):
+            comments = read_day(files.get(kind), ['author', 'score', 'date'], kind)
+            self.append(self.comments, day, self.authors.intern(comments['author']),
+                        score=comments['score'].to_numpy(dtype=np.int32), date=dates(comments['date']),
+                        daily=np.full(len(comments), kind == 'daily'))
+
+        if 'pay2post' in files:
+            pay2post = read_day(files['pay2post'], ['username'], 'pay2post')
+            self.append(self.pay2post, day, self.authors.intern(pay2post['username']))
+
+    def merge(self, part):
+        """Appends the days of an unfrozen CompactRound read with its own author dictionary."""
+        ids = self.authors.intern(part.authors.names)
+        offset = len(self.keys)
+        self.keys.extend(part.keys)
+        for mine, theirs in ((self.posts, part.posts), (self.comments, part.comments), (self.pay2post, part.pay2post)):
+            for name, chunks in theirs.items():
+                if name == 'author':
+                    chunks = [ids[chunk] for chunk in chunks]
+                elif name == 'day':
+                    chunks = [(chunk + offset).astype(np.int16) for chunk in chunks]
+                mine[name].extend(chunks)
+
+    @staticmethod
+    def append(arrays, day, author, **columns):
+        # Rows without an author never count.
+        keep = author >= 0
+        arrays['day'].append(np.full(keep.sum(), day, dtype=np.int16))
+        arrays['author'].append(author[keep])
+        for name, values in columns.items():
+            arrays[name].append(values[keep])
+
+    def freeze(self):
+        """Concatenates the per-day chunks into one array per column."""
+        for arrays in (self.posts, self.comments, self.pay2post):
+            for name, chunks in arrays.items():
+                if isinstance(chunks, list):
+                    arrays[name] = np.concatenate(chunks) if chunks else np.empty(0, dtype=np.int32)
+
+    def included(self, limit=scoring.COMMENT_LIMIT):
+        """
+        Mask of the comments within the per-day cap: the first `limit` comments of each author
+        and day, ordered by date, as scoring.cap_comments selects them.
+        """
+        c = self.comments
+        # lexsort is stable, so ties keep the comments-then-daily file order.
+        order = np.lexsort((c['date'], c['author'], c['day']))
+        day, author = c['day'][order], c['author'][order]
+        start = np.ones(len(order), dtype=bool)
+        start[1:] = (day[1:] != day[:-1]) | (author[1:] != author[:-1])
+        first = np.maximum.accumulate(np.where(start, np.arange(len(order)), 0))
+        mask = np.empty(len(order), dtype=bool)
+        mask[order] = np.arange(len(order)) - first < limit
+        return mask
+
+    def comment_scores(self, daily_factor=scoring.DAILY_FACTOR):
+        return np.where(self.comments['daily'], self.comments['score'] * daily_factor, self.comments['score'].astype(float))
+
+    def post_weights(self, flair_weights=scoring.FLAIR_WEIGHTS):
+        weights = np.array([flair_weights.get(flair, 1) for flair in FLAIRS] + [1], dtype=float)
+        return weights[self.posts['flair']]
+
+    def totals(self, limit=scoring.COMMENT_LIMIT):
+        """
+        Per-author totals of the round, as the summed per-day aggregates, the upvotes in units (see scoring.upvotes).
+
+        output: DataFrame indexed by author with comments/comment_units/posts/post_units
+        """
+        n = len(self.authors)
+        kept = self.included(limit)
+        author = self.comments['author'][kept]
+        comment_units = np.rint((self.comment_scores()[kept] - 1) * scoring.COMMENT_UNITS)
+        post_units = np.rint(self.post_weights() * scoring.POST_UNITS) * (self.posts['score'] - 1)
+        # Whole-number weights are summed exactly by bincount's float64 below 2**53.
+        totals = pd.DataFrame({
+            'comments': np.bincount(author, minlength=n),
+            'comment_units': np.bincount(author, weights=comment_units, minlength=n).astype(np.int64),
+            'posts': np.bincount(self.posts['author'], minlength=n),
+            'post_units': np.bincount(self.posts['author'], weights=post_units, minlength=n).astype(np.int64),
+        }, index=pd.Index(self.authors.names, name='author'))
+        return totals[(totals['comments'] > 0) | (totals['posts'] > 0)]
+
+    def pay2post_counts(self):
+        """Number of pay2post submissions per username, as scoring.pay2post_counts."""
+        counts = np.bincount(self.pay2post['author'], minlength=len(self.authors))
+        ids = np.flatnonzero(counts)
+        return pd.DataFrame({'username': np.array(self.authors.names, dtype=object)[ids], 'total_posts': counts[ids]})
+
+
+def _load_day(args):
+    """Process-pool worker: one day of a round, with its own author dictionary."""
+    key, files = args
+    part = CompactRound()
+    part.add_day(key, files)
+    return part
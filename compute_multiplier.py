@@ -1,307 +1,373 @@
 # Have your ETHERSCAN_API_KEY in an .env file before running this code.
 import os
+from functools import lru_cache
 import requests
 from dotenv import load_dotenv
 from web3 import Web3
+import numpy as np
 import pandas as pd
 from datetime import datetime
+import time
+from instrumentation import RunReport, record_call
 
 
-def get_multiplier(TARGET_WALLET):
-    """
-    Returns the multiplier for the distributions from r/EthTrader.
-    
-    inputs: TARGET_WALLET [str]
-    output: multiplier
-    """
+ARBISCAN_API_URL = "https://api.etherscan.io/v2/api?chainid=42161"
+ARBITRUM_RPC = "https://arb1.arbitrum.io/rpc"
+
+ORIGIN_WALLET = "0x439ceE4cC4EcBD75DC08D9a17E92bDdCc11CDb8C"
+TOKEN_CONTRACT = "0xF42e2B8bc2aF8B110b65be98dB1321B1ab8D44f5"
+LP_ADDRESS = "0x65f7a98D87BC21A3748545047632FEf4d3Ff9a67"
+MEMBERSHIP_KEYWORDS = ["EthTrader", "Special","Membership"]
+
+# Etherscan returns at most 10,000 rows per query (page * offset <= 10000).
+PAGE_SIZE = 10000
+# eth_call requests sent in one JSON-RPC batch.
+RPC_BATCH = 100
+BALANCE_OF = '0x70a08231'
 
+# Pooled HTTP connections for every Etherscan and JSON-RPC request of the process.
+SESSION = requests.Session()
+
+ERC20_ABI = [
+    {
+        "constant": True,
+        "inputs": [{"name": "_owner", "type": "address"}],  # Add input parameter
+        "name": "balanceOf",
+        "outputs": [{"name": "balance", "type": "uint256"}],
+        "type": "function"
+    },
+    {
+        "constant": True,
+        "inputs": [],
+        "name": "decimals",
+        "outputs": [{"name": "", "type": "uint8"}],
+        "type": "function"
+    }
+]
+
+
+# Provider, contracts, decimals and the API key are built once per process.
+
+@lru_cache(maxsize=None)
+def get_api_key():
     load_dotenv()
-    ETHERSCAN_API_KEY = os.getenv('ETHERSCAN_API_KEY')
-    ARBISCAN_API_URL = "https://api.etherscan.io/v2/api?chainid=42161"
-    ARBITRUM_RPC = "https://arb1.arbitrum.io/rpc"
+    return os.getenv('ETHERSCAN_API_KEY')
+
 
+@lru_cache(maxsize=None)
+def get_w3():
     w3 = Web3(Web3.HTTPProvider(ARBITRUM_RPC))
     if not w3.is_connected():
         raise ConnectionError("Failed to connect to Arbitrum RPC")
+    return w3
 
-    ERC20_ABI = [
-        {
-            "constant": True,
-            "inputs": [{"name": "_owner", "type": "address"}],  # Add input parameter
-            "name": "balanceOf",
-            "outputs": [{"name": "balance", "type": "uint256"}],
-            "type": "function"
-        },
-        {
-            "constant": True,
-            "inputs": [],
-            "name": "decimals",
-            "outputs": [{"name": "", "type": "uint8"}],
-            "type": "function"
-        }
-    ]
 
-    def get_token_decimals(token_contract_address):
-        """Get token decimals (Arbitrum-compatible)"""
-        contract = w3.eth.contract(address=token_contract_address, abi=ERC20_ABI)
-        return contract.functions.decimals().call()
+@lru_cache(maxsize=None)
+def get_contract(token_contract_address):
+    return get_w3().eth.contract(address=token_contract_address, abi=ERC20_ABI)
 
-    def get_token_balance(wallet_address, token_contract_address):
-        """Get token balance on Arbitrum"""
-        contract = w3.eth.contract(address=token_contract_address, abi=ERC20_ABI)
-        balance = contract.functions.balanceOf(wallet_address).call()
-        decimals = get_token_decimals(token_contract_address)
-        return balance / (10 ** decimals)
-
-    def get_transactions(target_wallet, origin_wallet, api_key):
-        """
-        Get ALL ERC-20 transfers from origin_wallet to target_wallet on Arbitrum One
-        """
-        ARBISCAN_API_URL = "https://api.etherscan.io/v2/api?chainid=42161"
-        
-        all_transactions = []
-        page = 1
-        offset = 10000
-        
-        while True:
-            params = {
-                'module': 'account',
-                'action': 'tokentx',
-                'contractaddress': '0xF42e2B8bc2aF8B110b65be98dB1321B1ab8D44f5',
-                'address': target_wallet,
-                'startblock': 0,
-                'endblock': 99999999,
-                'sort': 'asc',
-                'page': page,
-                'offset': offset,
-                'apikey': api_key
+
+@lru_cache(maxsize=None)
+def get_token_decimals(token_contract_address):
+    """Get token decimals (Arbitrum-compatible)"""
+    return get_contract(token_contract_address).functions.decimals().call()
+
+
+def get_token_balance(wallet_address, token_contract_address):
+    """Get token balance on Arbitrum"""
+    start = time.perf_counter()
+    balance = get_contract(token_contract_address).functions.balanceOf(wallet_address).call()
+    record_call('rpc:balanceOf', time.perf_counter() - start)
+    decimals = get_token_decimals(token_contract_address)
+    return balance / (10 ** decimals)
+
+
+def batch_balances(wallet_addresses, token_contract_address):
+    """
+    Token balances of many wallets, read with batched JSON-RPC balanceOf calls.
+
+    Returns:
+        Dictionary of lowercased address -> balance
+    """
+    decimals = get_token_decimals(token_contract_address)
+    addresses = list(dict.fromkeys(a.lower() for a in wallet_addresses))
+    balances = {}
+
+    for start in range(0, len(addresses), RPC_BATCH):
+        chunk = addresses[start:start + RPC_BATCH]
+        payload = [
+            {
+                'jsonrpc': '2.0',
+                'id': i,
+                'method': 'eth_call',
+                'params': [{'to': token_contract_address, 'data': BALANCE_OF + address[2:].rjust(64, '0')}, 'latest']
             }
-            
-            response = requests.get(ARBISCAN_API_URL, params=params)
-            data = response.json()
-            
-            if data['status'] != '1':
-                print(f"API Error: {data.get('message')}")
-                break
-                
-            transactions = data['result']
-            if not transactions:
-                break
-                
-            filtered = [
-                tx for tx in transactions
-                if (tx['from'].lower() == origin_wallet.lower() and 
-                    tx['to'].lower() == target_wallet.lower() and
-                    tx['contractAddress'].lower() == '0xf42e2b8bc2af8b110b65be98db1321b1ab8d44f5')
-            ]
-            all_transactions.extend(filtered)
-            
-            if len(transactions) < offset:
-                break
-                
-            page += 1
-        
-        return all_transactions
-
-    def transactions_to_dataframe(transactions):
-        """
-        Convert transaction data to a formatted pandas DataFrame.
-        
-        Args:
-            transactions: List of transaction dictionaries
-            
-        Returns:
-            Formatted pandas DataFrame
-        """
-        if not transactions:
-            return pd.DataFrame()  
-        
-        df = pd.DataFrame(transactions)
-        
-        df['value'] = df['value'].astype(float)
-        df['blockNumber'] = df['blockNumber'].astype(int)
-        df['timeStamp'] = df['timeStamp'].astype(int)
-        df['datetime'] = pd.to_datetime(df['timeStamp'], unit='s')
-        df['token_value'] = df['value'] / (10**18)
-        
-
-        pd.set_option('display.float_format', '{:.8f}'.format)
-        
-        display_cols = [
-            'datetime', 'blockNumber', 'hash', 
-            'from', 'to', 'contractAddress',
-            'token_value', 'value'
+            for i, address in enumerate(chunk)
         ]
-        
-        return df[display_cols].rename(columns={
-            'blockNumber': 'block',
-            'hash': 'tx_hash',
-            'contractAddress': 'token_address',
-            'value': 'raw_value'
-        })
-
-    def analyze_token_flows(target_wallet, origin_wallet, token_contract_address, lp_address, api_key):
-        """
-        Analyze token flows between wallets and LP
-        Returns comprehensive token flow metrics
-        """
+        t0 = time.perf_counter()
+        response = SESSION.post(ARBITRUM_RPC, json=payload)
+        record_call('rpc:eth_call batch', time.perf_counter() - t0, len(response.content), len(chunk))
+        for item in response.json():
+            if 'error' in item:
+                raise RuntimeError(f"RPC Error for {chunk[item['id']]}: {item['error']}")
+            balances[chunk[item['id']]] = int(item['result'], 16) / (10 ** decimals)
+
+    return balances
+
+
+def iter_transfer_pages(address, action='tokentx', contract_address=None, api_key=None, startblock=0):
+    """
+    Get a transfer history from Etherscan, one page at a time.
+
+    Etherscan caps every query at 10,000 rows, so the history is paged by block:
+    when a query comes back full, the next one starts at the last block seen
+    and the rows of that block are left for the next page. Every page thus
+    holds complete blocks.
+
+    Args:
+        address: wallet address, or None for every transfer of contract_address
+        action: 'tokentx' (ERC-20) or 'tokennfttx' (ERC-721)
+        contract_address: restrict to one token contract
+        api_key: Etherscan API key, read from .env if not given
+        startblock: first block to fetch
 
+    Yields:
+        Lists of transfer dictionaries, oldest first
+    """
+    api_key = api_key or get_api_key()
+
+    while True:
         params = {
             'module': 'account',
-            'action': 'tokentx',
-            'contractaddress': token_contract_address,
-            'address': target_wallet,
-            'startblock': 0,
+            'action': action,
+            'startblock': startblock,
             'endblock': 99999999,
             'sort': 'asc',
             'page': 1,
-            'offset': 10000,
+            'offset': PAGE_SIZE,
             'apikey': api_key
         }
-        
-        response = requests.get("https://api.etherscan.io/v2/api?chainid=42161", params=params)
+        if address:
+            params['address'] = address
+        if contract_address:
+            params['contractaddress'] = contract_address
+
+        start = time.perf_counter()
+        response = SESSION.get(ARBISCAN_API_URL, params=params)
         data = response.json()
-        
+        record_call('etherscan:' + action, time.perf_counter() - start, len(response.content), len(data.get('result') or []))
+
         if data['status'] != '1':
-            print(f"API Error: {data.get('message')}")
+            if data.get('message') != 'No transactions found':
+                print(f"API Error: {data.get('message')}")
+            return
 
+        page = data['result']
+        if len(page) < PAGE_SIZE:
+            yield page
+            return
+
+        last_block = int(page[-1]['blockNumber'])
+        if int(page[0]['blockNumber']) == last_block:
+            raise RuntimeError(f"More than {PAGE_SIZE} transfers in block {last_block} for {address or contract_address}")
+        yield [tx for tx in page if int(tx['blockNumber']) < last_block]
+        startblock = last_block
+
+
+def fetch_transfers(address, action='tokentx', contract_address=None, api_key=None, startblock=0):
+    """
+    Get the full transfer history of an address from Etherscan.
+
+    Returns:
+        List of transfer dictionaries, oldest first
+    """
+    return [tx for page in iter_transfer_pages(address, action, contract_address, api_key, startblock) for tx in page]
+
+
+def get_transactions(transfers, target_wallet, origin_wallet):
+    """
+    Get ALL ERC-20 transfers from origin_wallet to target_wallet on Arbitrum One
+    """
+    return [
+        tx for tx in transfers
+        if (tx['from'].lower() == origin_wallet.lower() and
+            tx['to'].lower() == target_wallet.lower() and
+            tx['contractAddress'].lower() == TOKEN_CONTRACT.lower())
+    ]
+
+
+def transactions_to_dataframe(transactions):
+    """
+    Convert transaction data to a formatted pandas DataFrame.
+
+    Args:
+        transactions: List of transaction dictionaries
+
+    Returns:
+        Formatted pandas DataFrame
+    """
+    if not transactions:
+        return pd.DataFrame()
+
+    df = pd.DataFrame(transactions)
+
+    df['value'] = df['value'].astype(float)
+    df['blockNumber'] = df['blockNumber'].astype(int)
+    df['timeStamp'] = df['timeStamp'].astype(int)
+    df['datetime'] = pd.to_datetime(df['timeStamp'], unit='s')
+    df['token_value'] = df['value'] / (10**18)
+
+
+    pd.set_option('display.float_format', '{:.8f}'.format)
+
+    display_cols = [
+        'datetime', 'blockNumber', 'hash',
+        'from', 'to', 'contractAddress',
+        'token_value', 'value'
+    ]
+
+    return df[display_cols].rename(columns={
+        'blockNumber': 'block',
+        'hash': 'tx_hash',
+        'contractAddress': 'token_address',
+        'value': 'raw_value'
+    })
+
+
+def transfers_frame(transfers):
+    """
+    Typed DataFrame of Etherscan transfers.
+
+    Addresses are lowercased once, blocks are integers and raw token values are
+    kept as exact Python integers, to be scaled by 10**decimals only after summing.
+    """
+    df = pd.DataFrame(transfers, columns=['blockNumber', 'from', 'to', 'value', 'tokenDecimal', 'tokenName'])
+    return pd.DataFrame({
+        'block': df['blockNumber'].astype('int64'),
+        'from': df['from'].str.lower(),
+        'to': df['to'].str.lower(),
+        'value': pd.Series([int(v) if isinstance(v, str) else 0 for v in df['value']], index=df.index, dtype=object),
+        'decimals': df['tokenDecimal'].fillna(18).astype('int64'),
+        'name': df['tokenName'].fillna('').str.lower(),
+    })
+
+
+def analyze_token_flows(transfers, target_wallet, origin_wallet, token_contract_address, lp_address, balance=get_token_balance, decimals=None):
+    """
+    Analyze token flows between wallets and LP
+    Returns comprehensive token flow metrics
+
+    balance(wallet, token) gives the current balances, over RPC by default.
+    """
+
+    if decimals is None:
         decimals = get_token_decimals(token_contract_address)
-        transactions = data['result']
-        
-        received_from_origin = 0
-        sent_to_origin = 0
-        sent_to_lp = 0
-        received_from_lp = 0
-        
-        for tx in transactions:
-            value = int(tx['value']) / (10 ** decimals)
-            
-            # Received from origin
-            if (tx['to'].lower() == target_wallet.lower() and 
-                tx['from'].lower() == origin_wallet.lower()):
-                received_from_origin += value
-                
-            # Sent to origin
-            elif (tx['from'].lower() == target_wallet.lower() and 
-                tx['to'].lower() == origin_wallet.lower()):
-                sent_to_origin += value
-                
-            # Sent to LP
-            elif (tx['from'].lower() == target_wallet.lower() and 
-                tx['to'].lower() == lp_address.lower()):
-                sent_to_lp += value
-                
-            # Received from LP
-            elif (tx['to'].lower() == target_wallet.lower() and 
-                tx['from'].lower() == lp_address.lower()):
-                received_from_lp += value
-        
-        current_balance = get_token_balance(target_wallet, token_contract_address)
-        lp_current_balance = get_token_balance(lp_address, token_contract_address)
-        net_lp_contribution = sent_to_lp - received_from_lp
-        remaining_in_lp = max(0, net_lp_contribution * (lp_current_balance / (lp_current_balance + net_lp_contribution)))
-        
-        net_from_origin = received_from_origin - sent_to_origin
-        net_transferred_to_lp = sent_to_lp - received_from_lp - remaining_in_lp
-        
-        return {
-            'tokens_received_from_origin': received_from_origin,
-            'tokens_sent_to_origin': sent_to_origin,
-            'net_from_origin': net_from_origin,
-            'tokens_sent_to_lp': sent_to_lp,
-            'tokens_received_from_lp': received_from_lp,
-            'tokens_still_in_lp': remaining_in_lp,
-            'net_transferred_to_lp': net_transferred_to_lp,
-            'current_wallet_balance': current_balance,
-            'final_calculation': net_from_origin - net_transferred_to_lp,
-            'total_transactions_processed': len(transactions)
-        }
 
-    def check_nft_mints(target_wallet, name_keywords, token_contract_address, api_key):
-        """
-        Check for NFT mints paid with ERC-20 token burns
-        Returns: (minted: bool, total_amount_paid: float)
-        """
+    df = transfers_frame(transfers)
+    target, origin, lp = target_wallet.lower(), origin_wallet.lower(), lp_address.lower()
 
-        params = {
-            'module': 'account',
-            'action': 'tokentx',
-            'contractaddress': token_contract_address,
-            'address': target_wallet,
-            'startblock': 0,
-            'endblock': 99999999,
-            'sort': 'asc',
-            'page': 1,
-            'offset': 10000,
-            'apikey': api_key
-        }
-        
-        response = requests.get("https://api.etherscan.io/v2/api?chainid=42161", params=params)
-        data = response.json()
-        
-        if data['status'] != '1':
-            print(f"API Error: {data.get('message')}")
-            return False, 0.0
+    # Every transfer goes in the first bucket it matches.
+    buckets = ['received_from_origin', 'sent_to_origin', 'sent_to_lp', 'received_from_lp']
+    bucket = np.select(
+        [(df['to'] == target) & (df['from'] == origin),
+         (df['from'] == target) & (df['to'] == origin),
+         (df['from'] == target) & (df['to'] == lp),
+         (df['to'] == target) & (df['from'] == lp)],
+        buckets, default='')
+    raw = df['value'].groupby(bucket).sum()
+    flows = {name: int(raw.get(name, 0)) / (10 ** decimals) for name in buckets}
 
-        nft_params = {
-            'module': 'account',
-            'action': 'tokennfttx',
-            'address': target_wallet,
-            'startblock': 0,
-            'endblock': 99999999,
-            'sort': 'asc',
-            'page': 1,
-            'offset': 10000,
-            'apikey': api_key
-        }
-        
-        nft_response = requests.get("https://api.etherscan.io/v2/api?chainid=42161", params=nft_params)
-        nft_data = nft_response.json()
-        
-        keywords = [kw.lower() for kw in name_keywords]
-        total_paid = 0.0
-        minted = False
-        
-        if nft_data['status'] == '1':
-            for nft_tx in nft_data['result']:
-                if (nft_tx['to'].lower() == target_wallet.lower() and
-                    nft_tx['from'] == '0x0000000000000000000000000000000000000000'):
-                    
-                    tx_name = nft_tx.get('tokenName', '').lower()
-                    if any(kw in tx_name for kw in keywords):
-                        minted = True
-                        
-                        for token_tx in data['result']:
-                            if (abs(int(token_tx['blockNumber']) - int(nft_tx['blockNumber'])) <= 5 and
-                                token_tx['from'].lower() == target_wallet.lower()):
-                                
-                                value = int(token_tx.get('value', 0))
-        
-                                decimals = int(token_tx.get('tokenDecimal', 18))
-                                total_paid += value / (10 ** decimals)
-        
-        return minted, total_paid
-
-    ORIGIN_WALLET = "0x439ceE4cC4EcBD75DC08D9a17E92bDdCc11CDb8C"
-    TOKEN_CONTRACT = "0xF42e2B8bc2aF8B110b65be98dB1321B1ab8D44f5"
-    LP_ADDRESS = "0x65f7a98D87BC21A3748545047632FEf4d3Ff9a67"
-
-    transactions = get_transactions(TARGET_WALLET, ORIGIN_WALLET, ETHERSCAN_API_KEY)
-
-    _, membership = check_nft_mints(
-        target_wallet=TARGET_WALLET,
-        name_keywords=["EthTrader", "Special","Membership"],
-        token_contract_address=TOKEN_CONTRACT,
-        api_key=ETHERSCAN_API_KEY
-    )
-
-    results = analyze_token_flows(
-        target_wallet=TARGET_WALLET,
-        origin_wallet=ORIGIN_WALLET,
-        token_contract_address=TOKEN_CONTRACT,
-        lp_address=LP_ADDRESS,
-        api_key=ETHERSCAN_API_KEY
-    )
+    received_from_origin = flows['received_from_origin']
+    sent_to_origin = flows['sent_to_origin']
+    sent_to_lp = flows['sent_to_lp']
+    received_from_lp = flows['received_from_lp']
+
+    current_balance = balance(target_wallet, token_contract_address)
+    lp_current_balance = balance(lp_address, token_contract_address)
+    net_lp_contribution = sent_to_lp - received_from_lp
+    remaining_in_lp = max(0, net_lp_contribution * (lp_current_balance / (lp_current_balance + net_lp_contribution)))
+
+    net_from_origin = received_from_origin - sent_to_origin
+    net_transferred_to_lp = sent_to_lp - received_from_lp - remaining_in_lp
+
+    return {
+        'tokens_received_from_origin': received_from_origin,
+        'tokens_sent_to_origin': sent_to_origin,
+        'net_from_origin': net_from_origin,
+        'tokens_sent_to_lp': sent_to_lp,
+        'tokens_received_from_lp': received_from_lp,
+        'tokens_still_in_lp': remaining_in_lp,
+        'net_transferred_to_lp': net_transferred_to_lp,
+        'current_wallet_balance': current_balance,
+        'final_calculation': net_from_origin - net_transferred_to_lp,
+        'total_transactions_processed': len(transfers)
+    }
+
+
+def balance_from_transfers(transfers, wallet_address):
+    """Token balance of a wallet from its complete transfer history (received minus sent)."""
+    df = transfers_frame(transfers)
+    wallet = wallet_address.lower()
+    raw = int(df['value'][df['to'] == wallet].sum()) - int(df['value'][df['from'] == wallet].sum())
+    decimals = int(df['decimals'].iloc[0]) if len(df) else 18
+    return raw / (10 ** decimals)
+
+
+def check_nft_mints(transfers, nft_transfers, target_wallet, name_keywords):
+    """
+    Check for NFT mints paid with ERC-20 token burns
+    Returns: (minted: bool, total_amount_paid: float)
+
+    Every token payment sent by the wallet within 5 blocks of a membership mint
+    counts towards that mint. Payments are sorted by block once and each mint's
+    window is found by binary search over prefix sums of the raw values.
+    """
+
+    target = target_wallet.lower()
+    keywords = [kw.lower() for kw in name_keywords]
+
+    nfts = transfers_frame(nft_transfers)
+    mints = nfts[(nfts['to'] == target) & (nfts['from'] == '0x0000000000000000000000000000000000000000')]
+    mints = mints[mints['name'].map(lambda name: any(kw in name for kw in keywords))]
+    if mints.empty:
+        return False, 0.0
+
+    tokens = transfers_frame(transfers)
+    payments = tokens[tokens['from'] == target].sort_values('block', kind='stable')
+    mint_blocks = mints['block'].to_numpy()
+
+    total_paid = 0.0
+    for decimals, group in payments.groupby('decimals'):
+        blocks = group['block'].to_numpy()
+        prefix = np.concatenate([np.array([0], dtype=object), np.cumsum(group['value'].to_numpy(dtype=object))])
+        lo = np.searchsorted(blocks, mint_blocks - 5, side='left')
+        hi = np.searchsorted(blocks, mint_blocks + 5, side='right')
+        total_paid += int((prefix[hi] - prefix[lo]).sum()) / (10 ** int(decimals))
+
+    return True, total_paid
+
+
+def compute_multiplier(x):
+    if x <= 25:
+        return 1
+    else:
+        return -0.012 * x + 1.3
+
+
+def need_to_buy(current_balance, earned, lp, membership):
+    c = 0.75*earned - (current_balance+lp+membership)
+    if c and c < 0:
+        return 0
+    else:
+        return 0.75*earned - (current_balance+lp+membership)
+
+
+def multiplier_from_flows(results, membership, transactions):
+    """
+    Turns the token flows of a wallet into its multiplier.
+
+    output: multiplier, need_to_buy, current_balance, earned, sent_to_lp, membership
+    """
 
     earned = results['tokens_received_from_origin']
     current_balance = results['current_wallet_balance']
@@ -315,31 +381,139 @@ def get_multiplier(TARGET_WALLET):
         ratio = 100*(1 - (current_balance + net_lp + membership) / earned)
     else:
         ratio = 25
-    
+
     if ratio < 0:
         ratio = 0
 
-    def compute_multiplier(x):
-        if x <= 25:
-            return 1
-        else:
-            return -0.012 * x + 1.3
-
-    def need_to_buy(current_balance, earned, lp, membership):
-        c = 0.75*earned - (current_balance+lp+membership)
-        if c and c < 0:
-            return 0
-        else:
-            return 0.75*earned - (current_balance+lp+membership)
-    
-    need_to_buy = need_to_buy(current_balance, earned, net_lp, membership)
-
-    if need_to_buy == 0: # Correcting for any rounding errors
+    to_buy = need_to_buy(current_balance, earned, net_lp, membership)
+
+    if to_buy == 0: # Correcting for any rounding errors
         multiplier = 1
-        
-    if not transactions: 
+
+    if not transactions:
         multiplier = 1.0
     else:
         multiplier = compute_multiplier(ratio)
 
-    return multiplier, need_to_buy, current_balance, earned, sent_to_lp, membership
+    return multiplier, to_buy, current_balance, earned, sent_to_lp, membership
+
+
+def load_histories(wallet_address, cache=None, offline=False):
+    """DONUT and NFT transfer histories of a wallet, from Etherscan or through a TransferCache."""
+    if cache is None:
+        if offline:
+            raise ValueError("Offline mode needs a TransferCache")
+        return fetch_transfers(wallet_address, 'tokentx', TOKEN_CONTRACT), fetch_transfers(wallet_address, 'tokennfttx')
+    return cache.get(wallet_address, 'tokentx', TOKEN_CONTRACT, offline), cache.get(wallet_address, 'tokennfttx', None, offline)
+
+
+def get_multiplier(TARGET_WALLET, cache=None, offline=False):
+    """
+    Returns the multiplier for the distributions from r/EthTrader.
+
+    The wallet's DONUT transfer history is fetched once and shared by the three analyses.
+
+    inputs:
+    TARGET_WALLET [str]
+    cache [TransferCache]: optional transfer_cache.TransferCache; only the blocks after the
+                           last cached one are fetched, and the balances read are stored
+    offline [bool]: compute from the cache only, without Etherscan or RPC calls. The wallet
+                    balance is derived from its cached transfers, the LP balance is the last
+                    one stored by an online run.
+    output: multiplier, need_to_buy, current_balance, earned, sent_to_lp, membership
+    """
+
+    transfers, nft_transfers = load_histories(TARGET_WALLET, cache, offline)
+    decimals = None
+
+    if cache is None:
+        balance = get_token_balance
+    elif offline:
+        decimals = int(transfers[0].get('tokenDecimal', 18)) if transfers else 18
+
+        def balance(wallet_address, token_contract_address):
+            if wallet_address.lower() == TARGET_WALLET.lower():
+                return balance_from_transfers(transfers, wallet_address)
+            return cache.balance(wallet_address, token_contract_address)
+    else:
+        def balance(wallet_address, token_contract_address):
+            value = get_token_balance(wallet_address, token_contract_address)
+            cache.store_balance(wallet_address, token_contract_address, value)
+            return value
+
+    transactions = get_transactions(transfers, TARGET_WALLET, ORIGIN_WALLET)
+
+    _, membership = check_nft_mints(transfers, nft_transfers, TARGET_WALLET, MEMBERSHIP_KEYWORDS)
+
+    results = analyze_token_flows(transfers, TARGET_WALLET, ORIGIN_WALLET, TOKEN_CONTRACT, LP_ADDRESS, balance, decimals)
+
+    return multiplier_from_flows(results, membership, transactions)
+
+
+MULTIPLIER_COLUMNS = ['multiplier', 'need_to_buy', 'current_balance', 'earned', 'sent_to_lp', 'membership']
+
+
+def get_multipliers(wallet_addresses, cache=None):
+    """
+    Multipliers of many wallets at once.
+
+    The current balances of all wallets and of the LP are read with batched
+    JSON-RPC calls (the LP once for everybody), and every Etherscan request
+    goes through the same pooled session.
+
+    inputs:
+    wallet_addresses [list]
+    cache [TransferCache]: optional transfer_cache.TransferCache
+    output: DataFrame with blockchain_address and the get_multiplier outputs
+    """
+    wallets = list(dict.fromkeys(wallet_addresses))
+    balances = batch_balances(wallets + [LP_ADDRESS], TOKEN_CONTRACT)
+    if cache is not None:
+        for address, value in balances.items():
+            cache.store_balance(address, TOKEN_CONTRACT, value)
+
+    def balance(wallet_address, token_contract_address):
+        return balances[wallet_address.lower()]
+
+    rows = []
+    for wallet in wallets:
+        transfers, nft_transfers = load_histories(wallet, cache)
+        transactions = get_transactions(transfers, wallet, ORIGIN_WALLET)
+        _, membership = check_nft_mints(transfers, nft_transfers, wallet, MEMBERSHIP_KEYWORDS)
+        results = analyze_token_flows(transfers, wallet, ORIGIN_WALLET, TOKEN_CONTRACT, LP_ADDRESS, balance)
+        rows.append([wallet, *multiplier_from_flows(results, membership, transactions)])
+
+    return pd.DataFrame(rows, columns=['blockchain_address'] + MULTIPLIER_COLUMNS)
+
+
+def round_multipliers(round_csv, out=None, cache=None, report=True, profile=False):
+    """
+    Adds the multiplier columns to a round_N.csv for every blockchain_address in it.
+
+    inputs:
+    round_csv [str]: path of the round csv
+    out [str]: where to write the result; defaults to round_csv itself
+    cache [TransferCache]: optional transfer_cache.TransferCache
+    report [bool]: write a JSON report of the run, with every Etherscan and RPC call, next to round_csv
+    profile [bool]: also write a cProfile profile of the run, see instrumentation.py
+    output: merged DataFrame
+    """
+    with RunReport('multipliers', profile=profile) as run:
+        with run.stage('file load', read=[round_csv]) as stage:
+            df = pd.read_csv(round_csv)
+            df = df.drop(columns=[c for c in MULTIPLIER_COLUMNS if c in df.columns])
+            stage['rows'] = len(df)
+        with run.stage('multipliers') as stage:
+            multipliers = get_multipliers(df['blockchain_address'].dropna().tolist(), cache)
+            stage['rows'] = len(multipliers)
+        with run.stage('write', written=[out or round_csv]):
+            df = pd.merge(df, multipliers, how='left', on=['blockchain_address'])
+            df.to_csv(out or round_csv, index=False)
+        if report:
+            run.write(os.path.dirname(os.path.abspath(round_csv)))
+    return df
+
+
+if __name__ == '__main__':
+    import sys
+    round_multipliers(*sys.argv[1:3])
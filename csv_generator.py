@@ -1,131 +1,104 @@
-def csv_generator(wdir,current_round):
-''' This function generates the final csv for posts and comments.
+def csv_generator(wdir,current_round,registry=None,compact=False,max_memory=None,limited=True,index=True,report=True,profile=False,workers=1):
+    ''' This function generates the final csv for posts and comments.
 
-Inputs:
-wdir [str]: working directory, must be the one where csv files generated with csv_miner.py and pay2post.py are stored.
-current_round [int]: current round #
+    Inputs:
+    wdir [str]: working directory, must be the one where csv files generated with csv_miner.py and pay2post.py are stored.
+    current_round [int]: current round #
+    registry [WalletRegistry]: registered wallets, see registry.py. By default users.json is cached in the current
+    directory and only downloaded again when it changed.
+    compact [bool]: score the whole round at once from its interned representation (see compact.py), which needs far
+    less memory than the day frames. Nothing is cached and the _limited files are not written in this mode.
+    max_memory [int]: if given, stream the day files in chunks and keep the memory used for scoring under this many
+    bytes (see streaming.py), for rounds too large to load at once. As with compact, nothing is cached.
+    limited [bool or str]: write the comments_DATE_limited.csv and daily_DATE_limited.csv copies (default), only an
+    included_DATE.csv mask of the capped comments with 'mask', or nothing with False.
+    index [bool]: update round_index.sqlite, the per-user index read by `python round_index.py <round_dir> <username>`.
+    The days scored again are indexed from their scored frames; the others are read with `workers` processes.
+    report [bool]: write report_csv_generator_TIMESTAMP.json, the duration, rows and bytes of every stage (see instrumentation.py).
+    profile [bool]: also write a cProfile profile of the run next to the report.
+    workers [int]: processes reading and scoring the day files in parallel, for the day aggregates and compact modes
+    and the round index.
+    Default is 1.
 
-Outputs:
-round_CURRENT_ROUND.csv
+    Outputs:
+    round_CURRENT_ROUND.csv
+    round_index.sqlite
+    report_csv_generator_TIMESTAMP.json
+
+    It can be run at any time during the round to publish the running standings: days whose
+    aggregate_DATE.csv is up to date are not scored again.
+
+    author: reddito321
+    '''
 
-author: reddito321
-'''
-    
     import numpy as np
     import pandas as pd
-    import glob
-    
+    from round_store import round_files
+    from scoring import pay2post_counts, round_table, upvotes
+    from aggregates import round_aggregates
+    from registry import WalletRegistry
+    from instrumentation import RunReport
+
     datadir = wdir
-    
-    comments = glob.glob(datadir+"/comment*.csv")
-    posts = glob.glob(datadir+"/post*.csv")
-    daily = glob.glob(datadir+"/daily*.csv")
-    p2p = glob.glob(datadir+"/pay2post*.csv")
-    
-    #%% Unique users
-    users = []
-    
-    for i in range(0,len(comments)):
-        c = pd.read_csv(comments[i])['author'].unique()
-        p = pd.read_csv(posts[i])['author'].unique()
-        d = pd.read_csv(daily[i])['author'].unique()
-        for j in range(0,len(c)):
-            users.append(c[j])
-        for j in range(0,len(p)):
-            users.append(p[j])
-        for j in range(0,len(d)):
-            users.append(d[j])
-            
-    all_users = np.unique(np.array(users))
-    
-    #%% Fetching only registered users
-    
-    wallets = pd.read_json("https://ethtrader.github.io/donut.distribution/users.json") 
-    wallets = wallets[wallets.address != '0xf8b45423AFb4144FCe5a2910fFE124067704043a']
-    df_wallets = pd.DataFrame({'username': wallets['username'], 'blockchain_address': wallets['address']})
-    
-    registered_users = pd.merge(pd.DataFrame({'username':all_users}),df_wallets,how='inner',on=['username'])
-    users = np.array(registered_users['username'])
-    
-    #%% Comments
-    cscores=np.zeros(len(users))
-    clen=np.zeros(len(users))
-    
-    for i in range(0,len(users)):
-        cscore=0
-        dscore=0
-        climit = 50
-        for j in range(0,len(comments)):
-            c = pd.read_csv(comments[j])
-            d = pd.read_csv(daily[j])
-            
-            idx = np.where(c['author']==users[i])[0]
-            idxd= np.where(d['author']==users[i])[0]
-            
-            d['score'] = d['score']/2
-            
-            user_comments = pd.concat([c.iloc[idx[0:]],d.iloc[idxd[0:]]]).sort_values('date')[0:climit]
-            to_remove = pd.concat([c.iloc[idx[0:]],d.iloc[idxd[0:]]]).sort_values('date')[climit:]
-        
-            cc = c[~c.id.isin(to_remove.id)]
-            dd = d[~d.id.isin(to_remove.id)]     
-            cc.to_csv(comments[j][:-4]+'_limited.csv', index=False)
-            dd.to_csv(daily[j][:-4]+'_limited.csv',index=False)
-    
-            cscore+=np.sum(user_comments['score']-1)
-            clen[i]+=len(user_comments)
-        cscores[i]+=cscore     
-        
-    #%% Posts
-    pscores=np.zeros(len(users))
-    plen=np.zeros(len(users))
-    
-    for i in range(0,len(users)):
-        # plen=0
-        pscore=0
-        for j in range(0,len(posts)):
-            p = pd.read_csv(posts[j])
-            for k in range(0,len(p)):
-                if p['author'][k] == users[i]:
-                    plen[i]+=1
-                    if p['flair'][k] == "Media" or p['flair'][k] == "Comedy" or p['flair'][k] == "Self Story":
-                        pscore+=0.25*(p['score'][k]-1)
-                    elif p['flair'][k] == "OC - Original Content":
-                        pscore+=2*(p['score'][k]-1)
-                    elif p['flair'][k] == "Question":
-                        pscore+=.1*(p['score'][k]-1)
-                    elif p['flair'][k] == "Link":
-                        pscore+=0.75*(p['score'][k]-1)
-                    else:
-                        pscore+=p['score'][k]-1
-    
-        pscores[i]+=pscore
-    
-    #%% pay2post
-    
-    p2p_list = []
-    
-    for i in range(0,len(p2p)):
-        p2 = pd.read_csv(p2p[i])
-        p2p_list.append(p2)
-    
-    p2p_ = pd.DataFrame({'username':(pd.concat(p2p_list))['username'].value_counts().index,'total_posts':(pd.concat(p2p_list)['username'].value_counts().values)})
-    
-    #%% Computing the ratios
-    
-    pratio = (510000)/np.sum(pscores.clip(min=0))
-    cratio = 340000/np.sum(cscores.clip(min=0))
-    
-    #%%
-    
-    userscores = pratio*pscores.clip(min=0) + cratio*cscores.clip(min=0)
-    
-    df = pd.DataFrame({'username': users, 'comments': clen.astype(int), 'comment_upvotes':cscores,'comment_score':cscores*cratio, 'posts': plen.astype(int),'post_upvotes': pscores,'post_score': pscores*pratio})
-    df = pd.merge(df,p2p_, how='left', on=['username']).fillna(0)
-    df['pay2post'] = -df['total_posts']*2.5*pratio
-    df['points'] = userscores+df['pay2post'] 
-    #%%
-    final_csv = pd.merge(df[df['points']!=0],df_wallets, how='inner', on=['username']).sort_values(by=['points'],ascending=False).reset_index(drop=True)
-    final_csv.to_csv(datadir+'/round_'+str(current_round)+'.csv',index=False)
-    
-    print(np.sum((userscores-plen*2.5*pratio))+2.5*pratio*np.sum(plen))
+    index_rows = None
+
+    with RunReport('csv_generator', profile=profile) as run:
+        # Day files are paired by the date in their name, so a missing file only affects its own day.
+        days = round_files(datadir)
+        day_paths = [path for files in days.values() for path in files.values()]
+
+        if max_memory:
+            from streaming import stream_round
+            with run.stage('file load + scoring (streaming)', read=day_paths):
+                totals, p2p = stream_round(days, max_memory=max_memory)
+                totals = upvotes(totals)
+        elif compact:
+            from compact import CompactRound
+            with run.stage('file load', read=day_paths) as stage:
+                round_data = CompactRound.load(days, workers=workers)
+                stage['rows'] = len(round_data.comments['author']) + len(round_data.posts['author'])
+            with run.stage('scoring'):
+                totals = upvotes(round_data.totals())
+                p2p = round_data.pay2post_counts()
+        else:
+            #%% Per-day totals, only the days whose files changed since their aggregate are scored again
+            with run.stage('file load + scoring (day aggregates)', read=day_paths) as stage:
+                index_rows = {} if index else None
+                day_totals = round_aggregates(datadir, days, limited, workers, index_rows)
+                stage['days'] = len(day_totals)
+            with run.stage('scoring'):
+                totals = upvotes(pd.concat(list(day_totals.values())).groupby(level=0).sum())
+                p2p = pay2post_counts(days)
+        all_users = np.unique(np.array(totals.index.astype(str)))
+
+        #%% Fetching only registered users
+
+        with run.stage('registry join') as stage:
+            if registry is None:
+                registry = WalletRegistry()
+            users = np.array(registry.registered(all_users))
+            stage['rows'] = len(users)
+
+        #%% Computing the ratios and points
+
+        with run.stage('scoring (round table)'):
+            df = round_table(totals, users, p2p)
+
+        #%%
+        round_csv = datadir+'/round_'+str(current_round)+'.csv'
+        with run.stage('write', written=[round_csv]) as stage:
+            final_csv = df[df['points']!=0].copy()
+            final_csv['blockchain_address'] = registry.addresses(final_csv['username'])
+            final_csv = final_csv.sort_values(by=['points'],ascending=False).reset_index(drop=True)
+            final_csv.to_csv(round_csv,index=False)
+            stage['rows'] = len(final_csv)
+
+        if index:
+            from round_index import update_index
+            with run.stage('round index') as stage:
+                stage['days'] = update_index(datadir, days, index_rows, workers)
+
+        if report:
+            run.write(datadir)
+
+    print(np.sum(df['points']-df['pay2post']))
@@ -1,5 +1,5 @@
-def csv_miner(wdir,crypto_sub,current_round,daily_hour,days_ago):
-'''This function mines crypto_sub and returns csv files with post, comment and daily thread 24-hour data.
+def csv_miner(wdir,crypto_sub,current_round,daily_hour,days_ago,fmt='csv',windowed=True,workers=1,profile=False,budget=None,round_dir=None,connect=None):
+  '''This function mines crypto_sub and returns csv files with post, comment and daily thread 24-hour data.
 
    Inputs:
    wdir [str]: working directory
@@ -7,124 +7,111 @@ def csv_miner(wdir,crypto_sub,current_round,daily_hour,days_ago):
    current_round [int]: current round #
    daily_hour [int]: starting hour for the scrapper. Default for ethtrader is 23, i.e. it starts at 23h (or 11 p.m.) of days_ago
    days_ago [int]: starting day. Default for ethtrader is 2, i.e. it fetches data starting 48h ago and ending 24h ago, with a starting time set by daily_hour.
+   fmt [str]: storage format of the day files, csv (default) or parquet. See round_store.py.
+   windowed [bool]: stop paging the listing once submissions are older than the mined day. Default is True; False walks the whole listing.
+   workers [int]: number of threads fetching the comment trees of the day's posts. Default is 1, i.e. one post after the other. See reddit_scheduler.py.
+   profile [bool]: also write a cProfile profile of the run next to its report.
+   budget [RateBudget]: request budget shared with other runs, e.g. a reddit_scheduler.FairBudget lane. Default is a new one.
+   round_dir [str]: where the day files are written. Default is wdir+str(current_round). See multi_miner.py to mine several subs at once.
+   connect [function]: returns an authenticated praw.Reddit client for a budget. Default is reddit_scheduler.connect, which reads
+   the credentials from the DEFAULT site of praw.ini.
 
    Output:
    posts_DATE.csv
    comments_DATE.csv
    daily_DATE.csv
+   aggregate_DATE.csv, the per-author totals of the day used by csv_generator.py
+   report_csv_miner_TIMESTAMP.json, duration, rows, bytes and Reddit requests/retries/429s of every stage (see instrumentation.py)
    
    NOTES: 
-   Insert your API key data on lines 36-41 and 90-95.
+   Put your API credentials in praw.ini, see reddit_scheduler.connect.
+   To mine the day and the pay2post mentions with a single client, see daily_pipeline.py.
    For optimal use, set this function as a task to be run every day at a fixed time whose hour > daily_hour.
    
    author: reddito321
    
 '''
   
-  import praw
-  from datetime import datetime, timedelta
-  import numpy as np
   import pandas as pd
-  import time
-  import os
+  from round_store import write_day, day_key, day_path, round_files
+  from aggregates import write_aggregate
+  from reddit_scheduler import RateBudget, fetch_all
+  import reddit_scheduler
+  from daily_harvest import harvest_daily, COLUMNS as DAILY_COLUMNS
+  from day_listing import POST_COLUMNS, day_window, day_submissions, post_row, comment_rows
+  from instrumentation import RunReport
   
-  begin_date = datetime(datetime.today().year, datetime.today().month, datetime.today().day, daily_hour, 0)  +timedelta(days=-days_ago)
-  end_date = begin_date+timedelta(hours=23,minutes=59,seconds=59)
+  begin_date, end_date = day_window(daily_hour, days_ago)
   
   # current_round=int(np.loadtxt("/home/mydonuts/current_round.txt"))
   
-  r = praw.Reddit(client_id=,
-              client_secret=,
-              user_agent=,
-              password=,
-              username=,
-              check_for_async=False)
-  
-  # Posts
-  sub_pscore = 0
-  posts = []
-  for submission in r.subreddit("ethtrader").new(limit=None):
-      if (((datetime.fromtimestamp(submission.created_utc) >= begin_date) and (datetime.fromtimestamp(submission.created_utc) <= end_date))):
-          sub_pscore += (submission.score)
-          posts.append(
-              {
-                  'id': submission.id,
-                  'score':submission.score,
-                  'author': submission.author.name,
-                  'date':  datetime.fromtimestamp(submission.created_utc),
-                  'comments': submission.num_comments,
-                  'flair': submission.link_flair_text
-              }
-          )
-  print('Post score: '+str(sub_pscore))
-  
-  posts = pd.DataFrame(posts)
-  posts.to_csv(wdir+str(current_round)+'/posts_'+str(begin_date.year)+str(begin_date.month)+str(begin_date.day)+'.csv')
+  # Every client of the run shares one request budget, see reddit_scheduler.py.
+  if budget is None:
+      budget = RateBudget()
+  with RunReport('csv_miner', budget, profile) as run:
+      if round_dir is None:
+          round_dir = wdir+str(current_round)
+      if connect is None:
+          connect = reddit_scheduler.connect
 
-  
-  # Comments
-  
-  comments=[]
-  sub_cscore = 0
-  
-  for i in range (0,len(posts)):
-      submission = r.submission(posts['id'][i])
-      if submission.author != "AutoModerator":
-          submission.comments.replace_more(limit=None)
-          for comment in submission.comments.list():
-              sub_cscore+=comment.score
-              comments.append(
-                  {
-                      'id': comment.id,
-                      'score':comment.score,
-                      'author': comment.author,
-                      'date':  datetime.fromtimestamp(comment.created_utc),
-                      'submission': comment.submission
-                  })
-  print('Comment score: '+str(sub_cscore))
-  
-  comments = pd.DataFrame(comments)
-  comments.to_csv(wdir+str(current_round)+'/comments_'+str(begin_date.year)+str(begin_date.month)+str(begin_date.day)+'.csv')
+      r = connect(budget)
 
-  
-  r = praw.Reddit(client_id=,
-              client_secret=,
-              user_agent=,
-              password=,
-              username=,
-              check_for_async=False)
-  
-  daily=[]
-  daily_id = posts['id'][posts['author']=='AutoModerator']
-  daily_ = r.submission(daily_id.iloc[0])
-  daily_cscore = 0
-  
-  # As the daily has more than 1k comments, we'll load the comment tree before looping over it, otherwise we'll get Error 429.
-  
-  try:
-      daily_.comments.replace_more(limit=None)
-  except:
-      try:
-          daily_.comments.replace_more(limit=None)
-      except:
-          try:
-              daily_.comments.replace_more(limit=None)
-          except: daily_.comments.replace_more(limit=None)
-  
-  # Giving a break to the API
-  time.sleep(3)
-  
-  for comment in daily_.comments.list():
-      daily_cscore+=comment.score
-      daily.append(
-          {
-              'id': comment.id,
-              'score':comment.score,
-              'author': comment.author,
-              'date':  datetime.fromtimestamp(comment.created_utc),
-              'submission': comment.submission
-              })
-  print('Daily score: '+str(daily_cscore))
-  
-  daily=pd.DataFrame(daily)
-  daily.to_csv(wdir+str(current_round)+'/daily_'+str(begin_date.year)+str(begin_date.month)+str(begin_date.day)+'.csv')
+      # Posts
+      # The listing is paged once, see day_listing.py.
+      with run.stage('listing fetch') as stage:
+          submissions, pages = day_submissions(r, crypto_sub, begin_date, end_date, windowed)
+          stage['rows'] = len(submissions)
+      print('Listing pages: '+str(pages))
+
+      posts = pd.DataFrame([post_row(submission) for submission in submissions], columns=POST_COLUMNS)
+      print('Post score: '+str(posts['score'].sum()))
+      with run.stage('write posts', written=[day_path(round_dir, 'posts', day_key(begin_date), fmt)]):
+          write_day(posts, round_dir, 'posts', day_key(begin_date), fmt)
+
+
+      # Comments
+
+      # Each worker thread fetches the submissions again with its own client, as PRAW is not thread safe.
+      def submission_comments(reddit, submission_id):
+          submission = reddit.submission(submission_id)
+          if submission.author == "AutoModerator":
+              return []
+          return comment_rows(submission)
+
+      # Results are gathered in the order of the posts, so the file is the same with any number of workers.
+      with run.stage('comment trees') as stage:
+          if workers > 1:
+              fetched = fetch_all(submission_comments, list(posts['id']), lambda: connect(budget), workers)
+          else:
+              fetched = [submission_comments(r, submission_id) for submission_id in posts['id']]
+          comments = [row for rows in fetched for row in rows]
+          stage['rows'] = len(comments)
+      sub_cscore = sum(row['score'] for row in comments)
+      print('Comment score: '+str(sub_cscore))
+
+      comments = pd.DataFrame(comments, columns=DAILY_COLUMNS)
+      with run.stage('write comments', written=[day_path(round_dir, 'comments', day_key(begin_date), fmt)]):
+          write_day(comments, round_dir, 'comments', day_key(begin_date), fmt)
+
+
+      r = connect(budget)
+
+      daily_id = posts['id'][posts['author']=='AutoModerator']
+
+      # As the daily has more than 1k comments, its tree is expanded in batches and checkpointed in the round
+      # directory; if this run dies, running it again resumes where it stopped. See daily_harvest.py.
+      with run.stage('daily thread', written=[day_path(round_dir, 'daily', day_key(begin_date), fmt)]) as stage:
+          if len(daily_id) > 0:
+              daily_len, daily_cscore = harvest_daily(r, daily_id.iloc[0], round_dir, day_key(begin_date), fmt)
+          else:
+              print('No daily thread found for '+begin_date.strftime('%Y-%m-%d')+', writing an empty daily file')
+              write_day(pd.DataFrame(columns=DAILY_COLUMNS), round_dir, 'daily', day_key(begin_date), fmt)
+              daily_len, daily_cscore = 0, 0
+          stage['rows'] = daily_len
+      print('Daily score: '+str(daily_cscore))
+
+      # Per-day aggregate, so that csv_generator only merges the days already mined.
+      with run.stage('aggregate'):
+          write_aggregate(round_dir, day_key(begin_date), round_files(round_dir)[day_key(begin_date)])
+
+      run.write(round_dir)
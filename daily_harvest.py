@@ -0,0 +1,149 @@
+"""
+Resumable harvesting of the daily thread.
+
+The daily thread has thousands of comments. Instead of a single
+replace_more(limit=None), its MoreComments are expanded a batch at a time.
+Collected comments are appended to daily_DATE.partial.csv as they arrive and
+the MoreComments still to expand are saved to daily_DATE.checkpoint.json, both
+in the round directory. If the run dies (429s, network, crash), calling
+harvest_daily again resumes from the checkpoint instead of starting over.
+"""
+import json
+import os
+import time
+from datetime import datetime
+
+import pandas as pd
+from praw.models import MoreComments
+
+from round_store import write_day
+
+
+COLUMNS = ['id', 'score', 'author', 'date', 'submission']
+
+
+def checkpoint_paths(round_dir, key):
+    return os.path.join(round_dir, 'daily_' + key + '.partial.csv'), os.path.join(round_dir, 'daily_' + key + '.checkpoint.json')
+
+
+def comment_row(comment):
+    return {
+        'id': comment.id,
+        'score': comment.score,
+        'author': comment.author,
+        'date': datetime.fromtimestamp(comment.created_utc),
+        'submission': comment.submission,
+    }
+
+
+def more_state(more):
+    return {'id': more.id, 'name': more.name, 'parent_id': more.parent_id, 'count': more.count, 'children': list(more.children)}
+
+
+def flatten(items):
+    """Comments and MoreComments of a morechildren answer or of a "continue this thread" forest."""
+    return items.list() if hasattr(items, 'list') else list(items)
+
+
+class Harvest:
+    """Progress of a daily-thread harvest, persisted after every batch."""
+
+    def __init__(self, reddit, submission_id, round_dir, key, submission=None):
+        self.submission = reddit.submission(submission_id) if submission is None else submission
+        self.rows_path, self.state_path = checkpoint_paths(round_dir, key)
+        self.pending = []
+        self.expanded = []
+        self.seen = set()
+        self.score = 0
+
+        if os.path.exists(self.state_path):
+            with open(self.state_path) as f:
+                state = json.load(f)
+            if state['submission'] != submission_id:
+                raise ValueError('Checkpoint '+self.state_path+' belongs to submission '+state['submission'])
+            self.expanded = state['expanded']
+            self.add(MoreComments(reddit, dict(data)) for data in state['pending'])
+            if os.path.exists(self.rows_path):
+                done = pd.read_csv(self.rows_path, usecols=['id', 'score'])
+                self.seen = set(done['id'])
+                self.score = int(done['score'].sum())
+        else:
+            if os.path.exists(self.rows_path):
+                os.remove(self.rows_path)
+            self.add(self.submission.comments.list())
+            self.save()
+
+    def add(self, items):
+        """Appends the new comments to the partial file and queues the MoreComments."""
+        rows = []
+        for item in items:
+            if isinstance(item, MoreComments):
+                item.submission = self.submission
+                self.pending.append(item)
+            elif item.id not in self.seen:
+                self.seen.add(item.id)
+                self.score += item.score
+                rows.append(comment_row(item))
+        if rows:
+            pd.DataFrame(rows, columns=COLUMNS).to_csv(self.rows_path, mode='a', header=not os.path.exists(self.rows_path), index=False)
+
+    def save(self):
+        state = {'submission': self.submission.id, 'expanded': self.expanded, 'pending': [more_state(more) for more in self.pending]}
+        with open(self.state_path + '.tmp', 'w') as f:
+            json.dump(state, f)
+        os.replace(self.state_path + '.tmp', self.state_path)
+
+    def expand(self, batch):
+        """Expands up to `batch` MoreComments, biggest first, and saves the progress."""
+        self.pending.sort(key=lambda more: -more.count)
+        todo, self.pending = self.pending[:batch], self.pending[batch:]
+        for i, more in enumerate(todo):
+            try:
+                items = flatten(more.comments(update=False))
+            except Exception:
+                # Keep what is left of the batch for the retry or the next run.
+                self.pending = todo[i:] + self.pending
+                self.save()
+                raise
+            self.add(items)
+            self.expanded.append(more.id)
+        self.save()
+
+
+def harvest_daily(reddit, submission_id, round_dir, key, fmt='csv', batch=32, retries=4, wait=3, submission=None):
+    """
+    Collects every comment of the daily thread, resuming from a checkpoint if there is one.
+
+    inputs:
+    reddit [praw.Reddit]: client
+    submission_id [str]: id of the daily thread
+    round_dir [str]: round directory, where the checkpoint and the day file are written
+    key [str]: date key of the day
+    fmt [str]: storage format of the day file, see round_store.py
+    batch [int]: MoreComments expanded between two checkpoints
+    retries [int]: consecutive failed batches before giving up; the checkpoint is kept for the next run
+    wait [float]: seconds to wait before retrying a failed batch, doubled on every retry
+    submission [praw.models.Submission]: the daily thread as already fetched, e.g. from the sub listing
+    output: (number of comments, total score)
+    """
+    harvest = Harvest(reddit, submission_id, round_dir, key, submission)
+    failures = 0
+    while harvest.pending:
+        try:
+            harvest.expand(batch)
+            failures = 0
+        except Exception:
+            failures += 1
+            if failures > retries:
+                raise
+            time.sleep(wait * 2 ** (failures - 1))
+
+    if os.path.exists(harvest.rows_path):
+        daily = pd.read_csv(harvest.rows_path)
+    else:
+        daily = pd.DataFrame(columns=COLUMNS)
+    write_day(daily, round_dir, 'daily', key, fmt)
+    for path in (harvest.rows_path, harvest.state_path):
+        if os.path.exists(path):
+            os.remove(path)
+    return len(daily), harvest.score
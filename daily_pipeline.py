@@ -0,0 +1,118 @@
+"""
+The whole daily mining run in one Reddit session.
+
+Running csv_miner and pay2post separately builds three praw.Reddit clients a
+day, refetches every submission of the listing for its comments and crashes
+when the day has no daily thread. daily_pipeline does the same work with one
+authenticated client and one request budget:
+
+1. pages /new once, keeping the Submission objects of the mined day;
+2. expands the comment trees of those objects, skipping the AutoModerator
+   threads and the submissions without comments;
+3. harvests the daily thread, taken from the same listing (see
+   daily_harvest.py); without one, an empty daily file is written;
+4. adds the new pay2post mentions to their day files (see mentions.py);
+5. writes the aggregate of the day and the run report.
+
+The client must be the account AutoModerator mentions in every new
+submission, as for pay2post.py. Its credentials are read from the pay2post
+section of praw.ini, or from another one given on the command line:
+
+    python daily_pipeline.py wdir current_round daily_hour days_ago [sub] [praw.ini site]
+"""
+import os
+
+import pandas as pd
+
+from aggregates import write_aggregate
+from daily_harvest import harvest_daily, COLUMNS as DAILY_COLUMNS
+from day_listing import POST_COLUMNS, day_window, day_submissions, author_name, post_row, comment_rows
+from instrumentation import RunReport
+from mentions import read_mark, write_mark, new_mentions, append_pay2post
+from reddit_scheduler import RateBudget, connect
+from round_store import write_day, day_key, day_path, round_files
+
+
+def daily_pipeline(reddit, wdir, crypto_sub, current_round, daily_hour, days_ago, fmt='csv', windowed=True,
+                   mentions=True, budget=None, round_dir=None, profile=False):
+    """
+    Mines the posts, comments, daily thread and pay2post mentions of one day with a single client.
+
+    inputs:
+    reddit [praw.Reddit]: authenticated client of the pay2post account, e.g. reddit_scheduler.connect(budget)
+    wdir [str]: working directory, where the pay2post high-water mark is kept
+    crypto_sub, current_round, daily_hour, days_ago, fmt, windowed: as in csv_miner
+    mentions [bool]: also add the new pay2post mentions to the round. Default is True.
+    budget [RateBudget]: budget the client was built with, whose counters go into the report
+    round_dir [str]: where the day files are written. Default is wdir+str(current_round).
+    profile [bool]: also write a cProfile profile of the run next to its report
+    output: {'posts', 'comments', 'daily', 'pay2post'} row counts of the run
+    """
+    begin_date, end_date = day_window(daily_hour, days_ago)
+    key = day_key(begin_date)
+    if round_dir is None:
+        round_dir = wdir + str(current_round)
+    os.makedirs(round_dir, exist_ok=True)
+    counts = {}
+
+    with RunReport('daily_pipeline', budget, profile) as run:
+        with run.stage('listing fetch') as stage:
+            submissions, pages = day_submissions(reddit, crypto_sub, begin_date, end_date, windowed)
+            stage['rows'] = len(submissions)
+        print('Listing pages: ' + str(pages))
+
+        posts = pd.DataFrame([post_row(s) for s in submissions], columns=POST_COLUMNS)
+        with run.stage('write posts', written=[day_path(round_dir, 'posts', key, fmt)]):
+            write_day(posts, round_dir, 'posts', key, fmt)
+        counts['posts'] = len(posts)
+        print('Post score: ' + str(posts['score'].sum()))
+
+        # The listing objects already know their author and comment count, so they are not fetched again.
+        with run.stage('comment trees') as stage:
+            comments = [row for s in submissions if author_name(s) != 'AutoModerator' and s.num_comments > 0 for row in comment_rows(s)]
+            stage['rows'] = len(comments)
+        comments = pd.DataFrame(comments, columns=DAILY_COLUMNS)
+        with run.stage('write comments', written=[day_path(round_dir, 'comments', key, fmt)]):
+            write_day(comments, round_dir, 'comments', key, fmt)
+        counts['comments'] = len(comments)
+        print('Comment score: ' + str(comments['score'].sum()))
+
+        daily = [s for s in submissions if author_name(s) == 'AutoModerator']
+        with run.stage('daily thread', written=[day_path(round_dir, 'daily', key, fmt)]) as stage:
+            if daily:
+                # As in csv_miner, the newest AutoModerator thread of the day is the daily discussion.
+                thread = daily[0]
+                counts['daily'], daily_score = harvest_daily(reddit, thread.id, round_dir, key, fmt, submission=thread)
+            else:
+                print('No daily thread found for ' + begin_date.strftime('%Y-%m-%d') + ', writing an empty daily file')
+                write_day(pd.DataFrame(columns=DAILY_COLUMNS), round_dir, 'daily', key, fmt)
+                counts['daily'], daily_score = 0, 0
+            stage['rows'] = counts['daily']
+        print('Daily score: ' + str(daily_score))
+
+        counts['pay2post'] = 0
+        if mentions:
+            mark = read_mark(wdir)
+            with run.stage('mention fetch') as stage:
+                rows, newest = new_mentions(reddit, mark, begin_date)
+                stage['rows'] = len(rows)
+            with run.stage('write pay2post') as stage:
+                counts['pay2post'] = stage['rows'] = append_pay2post(rows, round_dir, None if mark else begin_date, fmt)
+            if newest is not None:
+                write_mark(wdir, newest)
+            print('New pay2post submissions: ' + str(counts['pay2post']))
+
+        with run.stage('aggregate'):
+            write_aggregate(round_dir, key, round_files(round_dir)[key])
+
+        run.write(round_dir)
+    return counts
+
+
+if __name__ == '__main__':
+    import sys
+    wdir, current_round, daily_hour, days_ago = sys.argv[1], int(sys.argv[2]), int(sys.argv[3]), int(sys.argv[4])
+    crypto_sub = sys.argv[5] if len(sys.argv) > 5 else 'ethtrader'
+    budget = RateBudget()
+    reddit = connect(budget, sys.argv[6] if len(sys.argv) > 6 else 'pay2post')
+    print(daily_pipeline(reddit, wdir, crypto_sub, current_round, daily_hour, days_ago, budget=budget))
@@ -0,0 +1,68 @@
+"""
+The mined day of a subreddit, shared by csv_miner.py and daily_pipeline.py.
+
+A mined day starts at daily_hour, days_ago days back, and lasts 24 hours. Its
+submissions are taken from one pass over /new, which lists them newest first:
+in windowed mode paging stops at the first submission older than the day.
+created_utc is compared as raw epoch seconds; datetime is only built for the
+kept submissions.
+"""
+import math
+from datetime import datetime, timedelta
+
+from daily_harvest import comment_row
+
+
+POST_COLUMNS = ['id', 'score', 'author', 'date', 'comments', 'flair']
+
+
+def day_window(daily_hour, days_ago):
+    """(begin, end) datetimes of the mined day."""
+    today = datetime.today()
+    begin_date = datetime(today.year, today.month, today.day, daily_hour, 0) + timedelta(days=-days_ago)
+    return begin_date, begin_date + timedelta(hours=23, minutes=59, seconds=59)
+
+
+def day_submissions(reddit, crypto_sub, begin_date, end_date, windowed=True):
+    """
+    Submissions of crypto_sub created between begin_date and end_date, newest first.
+
+    inputs:
+    reddit [praw.Reddit]
+    crypto_sub [str]: name of the sub
+    begin_date, end_date [datetime]: the mined day, see day_window
+    windowed [bool]: stop paging once submissions are older than begin_date; False walks the whole listing
+    output: (list of Submission, number of listing pages read)
+    """
+    begin_ts, end_ts = begin_date.timestamp(), end_date.timestamp()
+    submissions = []
+    listing = reddit.subreddit(crypto_sub).new(limit=None)
+    for submission in listing:
+        created = submission.created_utc
+        if windowed and created < begin_ts:
+            break
+        if begin_ts <= created <= end_ts:
+            submissions.append(submission)
+    # Reddit serves listings in pages of 100 submissions.
+    return submissions, math.ceil(listing.yielded / 100)
+
+
+def author_name(thing):
+    return thing.author.name if thing.author is not None else None
+
+
+def post_row(submission):
+    return {
+        'id': submission.id,
+        'score': submission.score,
+        'author': author_name(submission),
+        'date': datetime.fromtimestamp(submission.created_utc),
+        'comments': submission.num_comments,
+        'flair': submission.link_flair_text,
+    }
+
+
+def comment_rows(submission):
+    """Rows of every comment of a submission; its comments are fetched with one request plus the MoreComments."""
+    submission.comments.replace_more(limit=None)
+    return [comment_row(comment) for comment in submission.comments.list()]
@@ -0,0 +1,160 @@
+"""
+Per-stage instrumentation of a run and its JSON report.
+
+A RunReport times the stages of a run (listing fetch, comment-tree expansion,
+daily thread, mentions, file load, scoring, registry join, write, ...) and
+records for each one its duration, row count, bytes read and written, the
+Reddit requests, retries and 429s of the run's RateBudget and the peak RSS of
+the process. Etherscan and RPC calls are recorded one by one while a report is
+active. The report is written as JSON into the round directory, and an
+optional cProfile profile of the whole run next to it.
+
+    with RunReport('csv_generator', budget=None, profile=False) as report:
+        with report.stage('file load', read=paths) as stage:
+            ...
+            stage['rows'] = len(df)
+        report.write(round_dir)
+
+Leaving the with block ends the run even when it raises, so later calls of the
+thread are not recorded into it and the profiler stops.
+"""
+import contextlib
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+_active = threading.local()
+
+
+def active():
+    """The RunReport of the current thread's run, or None."""
+    return getattr(_active, 'report', None)
+
+
+def record_call(kind, seconds, nbytes=0, rows=None):
+    """Adds an external call (Etherscan, RPC, ...) to the active report, if any."""
+    report = active()
+    if report is not None:
+        report.call(kind, seconds, nbytes, rows)
+
+
+def peak_rss_mib():
+    if resource is None:
+        return None
+    # ru_maxrss is in KiB on Linux, in bytes on macOS.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (2**20 if os.uname().sysname == 'Darwin' else 2**10), 1)
+
+
+def file_bytes(paths):
+    return sum(os.path.getsize(p) for p in paths if p and os.path.exists(p))
+
+
+class RunReport:
+    """
+    Stages and external calls of one run.
+
+    inputs:
+    name [str]: name of the entry point, used in the report file name
+    budget [RateBudget]: reddit_scheduler budget of the run, whose counters are recorded per stage
+    profile [bool or str]: also profile the run with cProfile; a str is the path of the .prof file
+    """
+
+    def __init__(self, name, budget=None, profile=False):
+        self.name = name
+        self.budget = budget
+        self.started = datetime.now()
+        self.start = time.perf_counter()
+        self.stages = []
+        self.calls = {}
+        self.lock = threading.Lock()
+        self.profile = profile
+        self.profiler = None
+        _active.report = self
+        if profile:
+            import cProfile
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+
+    def counters(self):
+        b = self.budget
+        return (b.requests, b.retries, b.throttled) if b is not None else (0, 0, 0)
+
+    @contextlib.contextmanager
+    def stage(self, name, read=(), written=()):
+        """
+        Times a stage. The yielded dict takes extra fields, e.g. stage['rows'] = n.
+
+        read, written [list]: files read/written by the stage, whose sizes are recorded
+        """
+        fields = {}
+        before = self.counters()
+        start = time.perf_counter()
+        try:
+            yield fields
+        finally:
+            requests, retries, throttled = (a - b for a, b in zip(self.counters(), before))
+            entry = {'stage': name, 'seconds': round(time.perf_counter() - start, 4)}
+            if read:
+                entry['bytes_read'] = file_bytes(read)
+            if written:
+                entry['bytes_written'] = file_bytes(written)
+            if self.budget is not None:
+                entry.update(requests=requests, retries=retries, throttled=throttled)
+            entry.update(fields)
+            entry['peak_rss_mib'] = peak_rss_mib()
+            self.stages.append(entry)
+
+    def call(self, kind, seconds, nbytes=0, rows=None):
+        with self.lock:
+            c = self.calls.setdefault(kind, {'calls': 0, 'seconds': 0.0, 'bytes': 0, 'rows': 0})
+            c['calls'] += 1
+            c['seconds'] = round(c['seconds'] + seconds, 4)
+            c['bytes'] += nbytes
+            c['rows'] += rows or 0
+
+    def summary(self):
+        report = {
+            'run': self.name,
+            'started': self.started.isoformat(timespec='seconds'),
+            'seconds': round(time.perf_counter() - self.start, 4),
+            'peak_rss_mib': peak_rss_mib(),
+            'stages': self.stages,
+            'calls': self.calls,
+        }
+        if self.budget is not None:
+            requests, retries, throttled = self.counters()
+            report['reddit'] = {'requests': requests, 'retries': retries, 'throttled': throttled}
+        return report
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """Ends the run: external calls are no longer recorded and the profiler stops."""
+        if getattr(_active, 'report', None) is self:
+            _active.report = None
+        if self.profiler is not None:
+            self.profiler.disable()
+
+    def write(self, directory):
+        """Ends the run and writes report_NAME_TIMESTAMP.json (and .prof when profiling) into directory."""
+        self.close()
+        base = os.path.join(directory, 'report_' + self.name + '_' + self.started.strftime('%Y%m%dT%H%M%S'))
+        os.makedirs(directory, exist_ok=True)
+        if self.profiler is not None:
+            self.profiler.dump_stats(self.profile if isinstance(self.profile, str) else base + '.prof')
+        with open(base + '.json', 'w') as f:
+            json.dump(self.summary(), f, indent=1, default=str)
+        return base + '.json'
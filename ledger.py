@@ -0,0 +1,197 @@
+"""
+Contract-wide DONUT transfer ledger.
+
+Instead of one tokentx query per wallet, every transfer of the DONUT contract
+and every mint of the membership NFT contracts is synced by block range into a
+local SQLite ledger. The figures get_multiplier computes per wallet ("received
+from origin", "sent to/received from LP", "membership paid", balances) are then
+computed for all wallets at once with grouped queries.
+
+Token values are stored as the raw integer amounts Etherscan returns (text, as
+they overflow SQLite integers), summed exactly per wallet and only then scaled
+by 10**decimals, as compute_multiplier.transfers_frame does.
+"""
+import sqlite3
+import time
+
+import pandas as pd
+
+from compute_multiplier import (
+    iter_transfer_pages, multiplier_from_flows, MULTIPLIER_COLUMNS,
+    ORIGIN_WALLET, TOKEN_CONTRACT, LP_ADDRESS, MEMBERSHIP_KEYWORDS,
+)
+
+
+ZERO_ADDRESS = '0x0000000000000000000000000000000000000000'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS token_transfers (
+    block INTEGER NOT NULL,
+    hash TEXT NOT NULL,
+    sender TEXT NOT NULL,
+    recipient TEXT NOT NULL,
+    value TEXT NOT NULL,
+    decimals INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS token_by_sender ON token_transfers (sender, block);
+CREATE INDEX IF NOT EXISTS token_by_recipient ON token_transfers (recipient, block);
+CREATE TABLE IF NOT EXISTS mints (
+    block INTEGER NOT NULL,
+    hash TEXT NOT NULL,
+    contract TEXT NOT NULL,
+    recipient TEXT NOT NULL,
+    token_name TEXT
+);
+CREATE INDEX IF NOT EXISTS mints_by_recipient ON mints (recipient);
+CREATE TABLE IF NOT EXISTS synced (
+    query TEXT PRIMARY KEY,
+    last_block INTEGER NOT NULL,
+    synced_at REAL NOT NULL
+);
+"""
+
+# Per-wallet flows, in the buckets of compute_multiplier.analyze_token_flows.
+BUCKETS = ['tokens_received_from_origin', 'tokens_sent_to_origin', 'tokens_sent_to_lp', 'tokens_received_from_lp']
+FLOWS = """
+SELECT recipient AS wallet, 'tokens_received_from_origin' AS bucket, value, decimals FROM token_transfers WHERE sender = :origin
+UNION ALL SELECT sender, 'tokens_sent_to_origin', value, decimals FROM token_transfers WHERE recipient = :origin
+UNION ALL SELECT sender, 'tokens_sent_to_lp', value, decimals FROM token_transfers WHERE recipient = :lp
+UNION ALL SELECT recipient, 'tokens_received_from_lp', value, decimals FROM token_transfers WHERE sender = :lp
+"""
+
+BALANCES = """
+SELECT recipient AS wallet, value, decimals, 1 AS sign FROM token_transfers
+UNION ALL SELECT sender, value, decimals, -1 FROM token_transfers
+"""
+
+# Token payments sent by the minter within 5 blocks of each membership mint, as in check_nft_mints.
+MEMBERSHIP = """
+SELECT m.recipient AS wallet, t.value, t.decimals
+FROM mints m JOIN token_transfers t
+  ON t.sender = m.recipient AND t.block BETWEEN m.block - 5 AND m.block + 5
+WHERE {keywords}
+"""
+
+
+def scaled_sums(rows, by):
+    """
+    Exact sums of raw token values per `by`, scaled by 10**decimals once summed.
+
+    inputs:
+    rows [DataFrame]: the `by` columns, value (raw integer as text), decimals and optionally sign
+    by [list]: columns to group by
+    output: Series of token amounts indexed by the `by` columns
+    """
+    sign = rows['sign'] if 'sign' in rows else [1] * len(rows)
+    raw = pd.Series([int(v) * s for v, s in zip(rows['value'], sign)], index=rows.index, dtype=object)
+    summed = raw.groupby([rows[c] for c in by] + [rows['decimals']]).sum()
+    decimals = summed.index.get_level_values(-1)
+    scaled = pd.Series([int(v) / (10 ** int(d)) for v, d in zip(summed, decimals)], index=summed.index.droplevel(-1), dtype=float)
+    return scaled.groupby(level=list(range(len(by)))).sum()
+
+
+class Ledger:
+    """
+    SQLite ledger of every DONUT transfer and membership mint.
+
+    inputs:
+    path [str]: SQLite file, created if missing
+    api_key [str]: Etherscan API key, read from .env if not given
+    """
+
+    def __init__(self, path='donut_ledger.sqlite', api_key=None):
+        self.db = sqlite3.connect(path)
+        self.db.executescript(SCHEMA)
+        self.api_key = api_key
+
+    def last_block(self, query):
+        row = self.db.execute('SELECT last_block FROM synced WHERE query = ?', (query,)).fetchone()
+        return None if row is None else row[0]
+
+    def _sync(self, query, action, contract_address, insert, rows):
+        last = self.last_block(query)
+        startblock = 0 if last is None else last + 1
+        count = 0
+        # Pages hold complete blocks, so progress is committed after each one.
+        for page in iter_transfer_pages(None, action, contract_address, self.api_key, startblock):
+            if not page:
+                continue
+            with self.db:
+                self.db.executemany(insert, [row for tx in page for row in rows(tx)])
+                self.db.execute('INSERT OR REPLACE INTO synced (query, last_block, synced_at) VALUES (?, ?, ?)', (query, int(page[-1]['blockNumber']), time.time()))
+            count += len(page)
+        return count
+
+    def sync_tokens(self, contract_address=TOKEN_CONTRACT):
+        """Adds the DONUT transfers after the last synced block. Returns the number of new transfers."""
+        def rows(tx):
+            yield (int(tx['blockNumber']), tx['hash'], tx['from'].lower(), tx['to'].lower(), str(int(tx['value'])), int(tx.get('tokenDecimal') or 18))
+        insert = 'INSERT INTO token_transfers (block, hash, sender, recipient, value, decimals) VALUES (?, ?, ?, ?, ?, ?)'
+        return self._sync('tokentx:' + contract_address.lower(), 'tokentx', contract_address, insert, rows)
+
+    def sync_mints(self, nft_contracts):
+        """Adds the mints of the membership NFT contracts after the last synced block."""
+        def rows(tx):
+            if tx['from'].lower() == ZERO_ADDRESS:
+                yield (int(tx['blockNumber']), tx['hash'], tx['contractAddress'].lower(), tx['to'].lower(), tx.get('tokenName', ''))
+        insert = 'INSERT INTO mints (block, hash, contract, recipient, token_name) VALUES (?, ?, ?, ?, ?)'
+        return sum(self._sync('tokennfttx:' + contract.lower(), 'tokennfttx', contract, insert, rows) for contract in nft_contracts)
+
+    def sync(self, nft_contracts):
+        """
+        Adds the new DONUT transfers and membership mints. Returns the number of new rows.
+
+        nft_contracts [list]: addresses of the membership NFT contracts. get_multiplier finds the memberships
+        among all the NFTs of a wallet by name; the ledger needs their contracts to sync the mints contract-wide.
+        """
+        if isinstance(nft_contracts, str):
+            nft_contracts = [nft_contracts]
+        if not nft_contracts:
+            raise ValueError('Ledger.sync needs the membership NFT contract addresses, without them no membership is counted')
+        return self.sync_tokens() + self.sync_mints(nft_contracts)
+
+    def figures(self, origin_wallet=ORIGIN_WALLET, lp_address=LP_ADDRESS, name_keywords=MEMBERSHIP_KEYWORDS):
+        """
+        Per-wallet flows, balance and membership paid, for every wallet in the ledger.
+
+        output: DataFrame indexed by lowercased wallet address
+        """
+        if self.db.execute("SELECT COUNT(*) FROM synced WHERE query LIKE 'tokennfttx:%'").fetchone()[0] == 0:
+            raise ValueError('No membership NFT contract synced yet, call sync(nft_contracts) first')
+        params = {'origin': origin_wallet.lower(), 'lp': lp_address.lower()}
+        rows = pd.read_sql_query(FLOWS, self.db, params=params)
+        flows = scaled_sums(rows, ['wallet', 'bucket']).unstack('bucket').reindex(columns=BUCKETS)
+        flows['origin_transfers'] = rows['wallet'][rows['bucket'] == 'tokens_received_from_origin'].value_counts()
+        balances = scaled_sums(pd.read_sql_query(BALANCES, self.db), ['wallet']).rename('current_wallet_balance').to_frame()
+        keywords = ' OR '.join(['lower(m.token_name) LIKE ?'] * len(name_keywords)) or '0'
+        rows = pd.read_sql_query(MEMBERSHIP.format(keywords=keywords), self.db, params=['%' + kw.lower() + '%' for kw in name_keywords])
+        membership = scaled_sums(rows, ['wallet']).rename('membership').to_frame()
+        figures = balances.join(flows, how='outer').join(membership, how='outer').fillna(0)
+        figures = figures.drop(index=[ZERO_ADDRESS], errors='ignore')
+        figures['origin_transfers'] = figures['origin_transfers'].astype(int)
+        return figures
+
+    def multipliers(self, wallet_addresses=None, lp_address=LP_ADDRESS):
+        """
+        Multipliers of the given wallets (all wallets in the ledger if None), as get_multiplier computes them.
+
+        output: DataFrame with blockchain_address and the get_multiplier outputs
+        """
+        figures = self.figures(lp_address=lp_address)
+        lp_current_balance = figures['current_wallet_balance'].get(lp_address.lower(), 0.0)
+        wallets = list(figures.index) if wallet_addresses is None else list(dict.fromkeys(wallet_addresses))
+
+        rows = []
+        for wallet in wallets:
+            f = figures.loc[wallet.lower()] if wallet.lower() in figures.index else pd.Series(0.0, index=figures.columns)
+            net_lp_contribution = f['tokens_sent_to_lp'] - f['tokens_received_from_lp']
+            remaining_in_lp = max(0, net_lp_contribution * (lp_current_balance / (lp_current_balance + net_lp_contribution)))
+            results = {
+                'tokens_received_from_origin': f['tokens_received_from_origin'],
+                'tokens_sent_to_lp': f['tokens_sent_to_lp'],
+                'net_transferred_to_lp': net_lp_contribution - remaining_in_lp,
+                'current_wallet_balance': f['current_wallet_balance'],
+            }
+            rows.append([wallet, *multiplier_from_flows(results, f['membership'], f['origin_transfers'] > 0)])
+
+        return pd.DataFrame(rows, columns=['blockchain_address'] + MULTIPLIER_COLUMNS)
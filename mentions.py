@@ -0,0 +1,93 @@
+"""
+Incremental ingestion of the pay2post mentions.
+
+AutoModerator mentions the pay2post account in every new submission. Instead of
+re-reading the last 300 mentions, new_mentions pages the inbox only down to the
+newest mention seen by the previous run (the high-water mark, kept in
+pay2post_state.json) and append_pay2post adds the new submissions to their day
+files. Running it every few hours covers busy days completely.
+"""
+import json
+import os
+from datetime import datetime
+
+import pandas as pd
+
+from round_store import day_key, day_path, read_day, write_day
+
+
+STATE = 'pay2post_state.json'
+
+
+def read_mark(wdir):
+    path = os.path.join(wdir, STATE)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def write_mark(wdir, mark):
+    path = os.path.join(wdir, STATE)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(mark, f)
+    os.replace(path + '.tmp', path)
+
+
+def mention_row(mention):
+    return {
+        'id': mention.submission.id,
+        'username': mention.body.split()[0][0:-1],
+        'date': datetime.fromtimestamp(mention.submission.created_utc),
+    }
+
+
+def new_mentions(reddit, mark, since):
+    """
+    Mentions newer than the high-water mark, newest first.
+
+    inputs:
+    reddit [praw.Reddit]: client of the pay2post account
+    mark [dict or None]: {'id', 'created_utc'} of the newest mention of the previous run
+    since [datetime]: without a mark, how far back to go
+    output: (list of pay2post rows, new mark)
+    """
+    stop = mark['created_utc'] if mark else since.timestamp()
+    rows = []
+    newest = mark
+    for mention in reddit.inbox.mentions(limit=None):
+        if mark and mention.id == mark['id']:
+            break
+        if mention.created_utc < stop:
+            break
+        if newest is mark:
+            newest = {'id': mention.id, 'created_utc': mention.created_utc}
+        rows.append(mention_row(mention))
+    return rows, newest
+
+
+def append_pay2post(rows, round_dir, since=None, fmt='csv'):
+    """
+    Adds new pay2post rows to the day file of their submission date, skipping submissions already there.
+
+    inputs:
+    rows [list]: pay2post rows, as returned by new_mentions
+    round_dir [str]: round directory
+    since [datetime]: rows of submissions older than this are dropped
+    fmt [str]: storage format of new day files, see round_store.py
+    output: number of rows added
+    """
+    new = pd.DataFrame(rows, columns=['id', 'username', 'date']).drop_duplicates('id')
+    if since is not None:
+        new = new[new['date'] >= since]
+    added = 0
+    for key, day in new.groupby(new['date'].map(day_key), sort=False):
+        path = day_path(round_dir, 'pay2post', key, fmt)
+        old = read_day(path, kind='pay2post') if os.path.exists(path) else None
+        if old is not None:
+            day = day[~day['id'].isin(old['id'])]
+        added += len(day)
+        if old is not None:
+            day = pd.concat([old, day], ignore_index=True)
+        write_day(day, round_dir, 'pay2post', key, fmt)
+    return added
@@ -0,0 +1,60 @@
+"""
+Mining several subreddits at once.
+
+Separate cron jobs per community race each other for the same API quota.
+mine_subs runs csv_miner for every sub on its own thread instead, all of them
+with the credentials of csv_miner's connect() and one shared budget: a
+reddit_scheduler.FairBudget in which each sub is a lane, so the subs take
+turns for requests and a busy one cannot starve the others. Each sub writes to
+its own round directory, wdir/SUB/ROUND, so the wall time is close to the one
+of the slowest sub rather than the sum of all of them.
+
+The subs do not share a single praw.Reddit client: PRAW is not thread safe, so
+each sub (and each of its worker threads) gets its own client, built from the
+same praw.ini credentials. Since they are one account and all their requests
+go through the one FairBudget, they use the API quota as a single
+authenticated client would.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from reddit_scheduler import FairBudget
+
+
+def sub_round_dir(wdir, sub, current_round):
+    return os.path.join(wdir, sub, str(current_round))
+
+
+def mine_subs(wdir, subs, current_round, daily_hour, days_ago, fmt='csv', workers=1, budget=None, connect=None):
+    """
+    Mines every sub of `subs` concurrently under one shared budget.
+
+    inputs:
+    wdir [str]: working directory; sub SUB is written to wdir/SUB/current_round
+    subs [list]: names of the subs, e.g. ['ethtrader', 'cryptocurrency']
+    current_round, daily_hour, days_ago, fmt, workers: as in csv_miner, for every sub
+    budget [RateBudget]: the shared budget, a new one if not given
+    connect [function]: as in csv_miner, called with the lane of each sub
+    output: {sub: None if it was mined, else the exception that stopped it}
+    """
+    from csv_miner import csv_miner
+
+    fair = FairBudget(budget)
+
+    def mine(sub):
+        round_dir = sub_round_dir(wdir, sub, current_round)
+        os.makedirs(round_dir, exist_ok=True)
+        csv_miner(wdir, sub, current_round, daily_hour, days_ago, fmt, True, workers, budget=fair.lane(sub), round_dir=round_dir, connect=connect)
+
+    with ThreadPoolExecutor(max_workers=len(subs)) as pool:
+        futures = {sub: pool.submit(mine, sub) for sub in subs}
+    # One failing sub does not stop the others.
+    return {sub: future.exception() for sub, future in futures.items()}
+
+
+if __name__ == '__main__':
+    import sys
+    # python multi_miner.py wdir current_round daily_hour days_ago sub [sub ...]
+    wdir, current_round, daily_hour, days_ago = sys.argv[1], int(sys.argv[2]), int(sys.argv[3]), int(sys.argv[4])
+    for sub, error in mine_subs(wdir, sys.argv[5:], current_round, daily_hour, days_ago).items():
+        print(sub + ': ' + ('ok' if error is None else 'failed, ' + repr(error)))
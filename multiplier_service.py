@@ -0,0 +1,181 @@
+"""
+Long-running multiplier service.
+
+Keeps the Arbitrum provider, the DONUT contract, the HTTP session and a
+TTL/LRU cache of per-wallet results warm, and serves lookups over a local HTTP
+port or a Unix socket:
+
+    GET  /multiplier/<wallet>        multiplier of a wallet (?refresh=1 skips the cache)
+    POST /invalidate                 drop every cached result, e.g. when a new distribution lands
+    POST /invalidate/<wallet>        drop the cached result of one wallet
+    GET  /health                     cache size and hit/miss counters
+
+Run with: python multiplier_service.py [--port 8765 | --socket /path/to.sock] [--ttl 3600] [--cache transfers.sqlite]
+"""
+import argparse
+import json
+import os
+import socketserver
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import compute_multiplier
+from compute_multiplier import get_multiplier, MULTIPLIER_COLUMNS, TOKEN_CONTRACT
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries expire after `ttl` seconds."""
+
+    def __init__(self, maxsize=10000, ttl=3600):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                self.entries.pop(key, None)
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, key=None):
+        """Drops one entry, or all of them when key is None. Returns the number dropped."""
+        with self.lock:
+            if key is None:
+                dropped = len(self.entries)
+                self.entries.clear()
+                return dropped
+            return 0 if self.entries.pop(key, None) is None else 1
+
+
+class MultiplierService:
+    """
+    Multiplier lookups with warm clients and cached results.
+
+    inputs:
+    ttl [float]: seconds a result stays cached
+    maxsize [int]: maximum number of cached wallets
+    transfer_cache [TransferCache]: optional transfer_cache.TransferCache for the histories
+    """
+
+    def __init__(self, ttl=3600, maxsize=10000, transfer_cache=None):
+        self.results = TTLCache(maxsize, ttl)
+        self.transfer_cache = transfer_cache
+        # The transfer cache shares one SQLite connection between the request threads.
+        self.cache_lock = threading.Lock() if transfer_cache is not None else None
+        self.warm()
+
+    def warm(self):
+        """Builds the provider and contract and reads the API key and decimals once."""
+        compute_multiplier.get_api_key()
+        compute_multiplier.get_w3()
+        compute_multiplier.get_contract(TOKEN_CONTRACT)
+        compute_multiplier.get_token_decimals(TOKEN_CONTRACT)
+
+    def lookup(self, wallet, refresh=False):
+        key = wallet.lower()
+        result = None if refresh else self.results.get(key)
+        if result is None:
+            if self.cache_lock is None:
+                values = get_multiplier(wallet)
+            else:
+                with self.cache_lock:
+                    values = get_multiplier(wallet, self.transfer_cache)
+            result = dict(zip(MULTIPLIER_COLUMNS, values))
+            self.results.put(key, result)
+        return result
+
+    def invalidate(self, wallet=None):
+        return self.results.invalidate(None if wallet is None else wallet.lower())
+
+    def health(self):
+        return {'cached': len(self.results.entries), 'hits': self.results.hits, 'misses': self.results.misses}
+
+
+def make_handler(service):
+    class Handler(BaseHTTPRequestHandler):
+
+        def send_json(self, status, body):
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            parts = url.path.strip('/').split('/')
+            if parts == ['health']:
+                return self.send_json(200, service.health())
+            if len(parts) == 2 and parts[0] == 'multiplier':
+                refresh = parse_qs(url.query).get('refresh', ['0'])[0] not in ('0', '')
+                try:
+                    return self.send_json(200, dict(service.lookup(parts[1], refresh), blockchain_address=parts[1]))
+                except Exception as e:
+                    return self.send_json(502, {'error': str(e)})
+            self.send_json(404, {'error': 'not found'})
+
+        def do_POST(self):
+            parts = urlparse(self.path).path.strip('/').split('/')
+            if parts[0] == 'invalidate' and len(parts) <= 2:
+                return self.send_json(200, {'invalidated': service.invalidate(parts[1] if len(parts) == 2 else None)})
+            self.send_json(404, {'error': 'not found'})
+
+        def address_string(self):
+            # Unix socket clients have no address.
+            return self.client_address[0] if self.client_address else 'unix'
+
+    return Handler
+
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def serve(service, port=8765, socket_path=None):
+    """Serves the lookups on 127.0.0.1:port, or on a Unix socket when socket_path is given."""
+    handler = make_handler(service)
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        server = ThreadingUnixHTTPServer(socket_path, handler)
+    else:
+        server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve r/EthTrader multipliers with warm caches.')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--socket', help='Unix socket path, instead of the local port')
+    parser.add_argument('--ttl', type=float, default=3600, help='seconds a result stays cached')
+    parser.add_argument('--maxsize', type=int, default=10000, help='maximum number of cached wallets')
+    parser.add_argument('--cache', help='transfer_cache SQLite file for the transfer histories')
+    args = parser.parse_args()
+
+    transfer_cache = None
+    if args.cache:
+        from transfer_cache import TransferCache
+        transfer_cache = TransferCache(args.cache, fetch=compute_multiplier.fetch_transfers)
+    serve(MultiplierService(args.ttl, args.maxsize, transfer_cache), args.port, args.socket)
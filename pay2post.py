@@ -1,58 +1,93 @@
-def pay2post(wdir,current_round):
-'''This function returns csv with all the posts and their authors in the previous day, i.e. if you run it today, it will fetch data
+def pay2post(wdir,current_round,fmt='csv',incremental=False,profile=False,connect=None):
+  '''This function returns csv with all the posts and their authors in the previous day, i.e. if you run it today, it will fetch data
 from yesterday.
 
    Inputs:
    wdir [str]: working directory
    current_round [int]: current round #
+   fmt [str]: storage format of the day file, csv (default) or parquet. See round_store.py.
+   incremental [bool]: only fetch the mentions newer than the ones seen by the previous incremental run, and add
+   them to the day files of their submission date. The first run goes back to yesterday. Meant to be run every
+   few hours, see mentions.py.
+   profile [bool]: also write a cProfile profile of the run next to its report.
+   connect [function]: returns an authenticated praw.Reddit client for a budget. Default is reddit_scheduler.connect with the
+   pay2post site of praw.ini, the account AutoModerator mentions, which is not the DEFAULT one the miners use.
    
    Output:
    pay2post_DATE.csv
+   report_pay2post_TIMESTAMP.json, duration and rows of the mention fetch and the write (see instrumentation.py)
    
    NOTES: 
-   Insert your API key data on lines 25-30. Set the function to run on a specific hour every day.
+   Put the API credentials of the pay2post account in the [pay2post] section of praw.ini, see reddit_scheduler.connect.
+   Without that section the run fails instead of reading the inbox of another account. Set the function to run on a specific hour every day.
    For use in your own sub, make AutoModerator mention the account whose API will be used in every new post.
    
    author: reddito321
    
 '''
   
-  import praw
   from datetime import datetime, timedelta
   import numpy as np
   import pandas as pd
+  from round_store import write_day, day_key, day_path
+  from mentions import read_mark, write_mark, new_mentions, append_pay2post
+  from instrumentation import RunReport
+  from reddit_scheduler import RateBudget
+  import reddit_scheduler
   
-  r = praw.Reddit(client_id=,
-        client_secret=,
-        user_agent=,
-        password=,
-        username=,
-        check_for_async=False) # This is related to ethtrader-pay2post bot.
+  if connect is None:
+      connect = lambda budget: reddit_scheduler.connect(budget, 'pay2post')
+  budget = RateBudget()
+  r = connect(budget) # This is related to ethtrader-pay2post bot.
   
   # current_round=int(np.loadtxt(wdir+"current_round.txt"))
   begin_date = datetime(datetime.today().year, datetime.today().month, datetime.today().day, 0, 0)+timedelta(days=-1)
   end_date = begin_date+timedelta(hours=23,minutes=59,seconds=59)
+  round_dir = wdir+str(current_round)
 
-  pay2post = []
-  
-  try:
-      for mention in r.inbox.mentions(limit=300):
-          pay2post.append(
-                      {
-                          'id': mention.submission.id,
-                          'username': mention.body.split()[0][0:-1],# mention.submission.author,
-                          'date':  datetime.fromtimestamp(mention.submission.created_utc),
-                      })
-  except:
-      for mention in r.inbox.mentions(limit=300):
-          pay2post.append(
-                      {
-                          'id': mention.submission.id,
-                          'username': mention.body.split()[0][0:-1],# mention.submission.author,
-                          'date':  datetime.fromtimestamp(mention.submission.created_utc),
-                      })
-  
-  pay2post = pd.DataFrame(pay2post)
-  pay2post = pay2post.loc[(pay2post['date'] >= begin_date) & (pay2post['date'] < end_date)]
-  
-  pay2post.to_csv(wdir+str(current_round)+'/pay2post_'+str(begin_date.year)+str(begin_date.month)+str(begin_date.day)+'.csv',index=False)
+  with RunReport('pay2post', budget, profile) as run:
+      if incremental:
+          mark = read_mark(wdir)
+          with run.stage('mention fetch') as stage:
+              rows, newest = new_mentions(r, mark, begin_date)
+              stage['rows'] = len(rows)
+          with run.stage('write') as stage:
+              added = append_pay2post(rows, round_dir, None if mark else begin_date, fmt)
+              stage['rows'] = added
+          if newest is not None:
+              write_mark(wdir, newest)
+          run.write(round_dir)
+          print('New pay2post submissions: '+str(added))
+          return
+
+      with run.stage('mention fetch') as stage:
+          pay2post = []
+
+          try:
+              for mention in r.inbox.mentions(limit=300):
+                  pay2post.append(
+                              {
+                                  'id': mention.submission.id,
+                                  'username': mention.body.split()[0][0:-1],# mention.submission.author,
+                                  'date':  datetime.fromtimestamp(mention.submission.created_utc),
+                              })
+          except:
+              for mention in r.inbox.mentions(limit=300):
+                  pay2post.append(
+                              {
+                                  'id': mention.submission.id,
+                                  'username': mention.body.split()[0][0:-1],# mention.submission.author,
+                                  'date':  datetime.fromtimestamp(mention.submission.created_utc),
+                              })
+
+          stage['rows'] = len(pay2post)
+
+      # The retry above starts over from the newest mention.
+      pay2post = pd.DataFrame(pay2post).drop_duplicates('id')
+      pay2post = pay2post.loc[(pay2post['date'] >= begin_date) & (pay2post['date'] < end_date)]
+
+      with run.stage('write', written=[day_path(round_dir, 'pay2post', day_key(begin_date), fmt)]) as stage:
+          write_day(pay2post, round_dir, 'pay2post', day_key(begin_date), fmt)
+          stage['rows'] = len(pay2post)
+
+      run.write(round_dir)
@@ -0,0 +1,200 @@
+"""
+Shared Reddit request budget and concurrent fetching.
+
+PRAW is not thread safe, so each worker thread gets its own praw.Reddit
+instance. All of them send their requests through a BudgetedRequestor bound to
+one RateBudget: a token bucket refilled at the rate allowed by Reddit's
+x-ratelimit-remaining / x-ratelimit-reset headers, that backs off on 429s.
+Runs mining several subreddits at once share it through a FairBudget.
+"""
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import praw
+import prawcore
+
+
+class RateBudget:
+    """
+    Token bucket shared by every client of a run.
+
+    inputs:
+    rate [float]: requests per second until Reddit's headers say otherwise. Reddit allows 100 per minute per client.
+    burst [int]: maximum number of requests sent back to back
+    max_retries [int]: retries of a request answered with 429 before giving up
+    """
+
+    def __init__(self, rate=100/60, burst=10, max_retries=5):
+        self.rate = rate
+        self.burst = burst
+        self.max_retries = max_retries
+        self.tokens = burst
+        self.stamp = time.monotonic()
+        self.blocked_until = 0
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.retries = 0
+        self.throttled = 0
+
+    def acquire(self):
+        """Blocks until a request can be sent."""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+                self.stamp = now
+                wait = self.blocked_until - now
+                if wait <= 0 and self.tokens >= 1:
+                    self.tokens -= 1
+                    self.requests += 1
+                    return
+                if wait <= 0:
+                    wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def observe(self, headers):
+        """Adjusts the refill rate to the x-ratelimit headers of a response."""
+        remaining = headers.get('x-ratelimit-remaining')
+        reset = headers.get('x-ratelimit-reset')
+        if remaining is None or reset is None:
+            return
+        remaining, reset = float(remaining), max(float(reset), 1)
+        with self.lock:
+            if remaining < 1:
+                self.blocked_until = max(self.blocked_until, time.monotonic() + reset)
+            else:
+                self.rate = remaining / reset
+                self.tokens = min(self.tokens, remaining)
+
+    def backoff(self, headers, attempt):
+        """Pauses every client after a 429, for retry-after seconds or an exponential delay."""
+        delay = headers.get('retry-after')
+        delay = float(delay) if delay is not None else min(2 ** attempt, 60)
+        with self.lock:
+            self.throttled += 1
+            self.retries += 1
+            self.blocked_until = max(self.blocked_until, time.monotonic() + delay)
+
+
+class FairBudget:
+    """
+    RateBudget shared fairly between lanes, e.g. one lane per subreddit mined at the same time.
+
+    Lanes waiting for a request take turns, whatever the number of threads in each lane, so a
+    subreddit with a large day cannot starve the others of the shared quota.
+
+    inputs:
+    budget [RateBudget]: the shared budget, a new one if not given
+    """
+
+    def __init__(self, budget=None):
+        self.budget = budget or RateBudget()
+        self.max_retries = self.budget.max_retries
+        self.cond = threading.Condition()
+        self.turns = deque()
+        self.waiting = {}
+        self.busy = False
+
+    def lane(self, name):
+        return Lane(self, name)
+
+    def acquire(self, name):
+        with self.cond:
+            self.waiting[name] = self.waiting.get(name, 0) + 1
+            if name not in self.turns:
+                self.turns.append(name)
+            while self.busy or self.turns[0] != name:
+                self.cond.wait()
+            self.busy = True
+        try:
+            self.budget.acquire()
+        finally:
+            with self.cond:
+                self.busy = False
+                self.waiting[name] -= 1
+                self.turns.popleft()
+                if self.waiting[name]:
+                    self.turns.append(name)
+                self.cond.notify_all()
+
+
+class Lane:
+    """One lane of a FairBudget, usable wherever a RateBudget is, with its own counters."""
+
+    def __init__(self, fair, name):
+        self.fair = fair
+        self.name = name
+        self.max_retries = fair.max_retries
+        self.requests = 0
+        self.retries = 0
+        self.throttled = 0
+
+    def acquire(self):
+        self.fair.acquire(self.name)
+        self.requests += 1
+
+    def observe(self, headers):
+        self.fair.budget.observe(headers)
+
+    def backoff(self, headers, attempt):
+        self.throttled += 1
+        self.retries += 1
+        self.fair.budget.backoff(headers, attempt)
+
+
+class BudgetedRequestor(prawcore.Requestor):
+    """prawcore requestor sending every request through a RateBudget."""
+
+    def __init__(self, *args, budget=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.budget = budget or RateBudget()
+
+    def request(self, *args, **kwargs):
+        for attempt in range(self.budget.max_retries + 1):
+            self.budget.acquire()
+            response = super().request(*args, **kwargs)
+            self.budget.observe(response.headers)
+            if response.status_code != 429:
+                break
+            if attempt < self.budget.max_retries:
+                self.budget.backoff(response.headers, attempt)
+        return response
+
+
+def budgeted(budget):
+    """praw.Reddit keyword arguments that route its requests through `budget`."""
+    return {'requestor_class': BudgetedRequestor, 'requestor_kwargs': {'budget': budget}}
+
+
+def connect(budget=None, site='DEFAULT'):
+    """
+    Authenticated praw.Reddit client whose requests go through `budget`.
+
+    The credentials (client_id, client_secret, user_agent, username, password) are read from the
+    `site` section of praw.ini, see https://praw.readthedocs.io/en/stable/getting_started/configuration/prawini.html
+    """
+    return praw.Reddit(site, check_for_async=False, **budgeted(budget or RateBudget()))
+
+
+def fetch_all(fetch, items, connect, workers=8):
+    """
+    Applies fetch(reddit, item) to every item on a pool of threads.
+
+    inputs:
+    fetch [function]: called with a praw.Reddit instance and an item
+    items [list]: items to fetch
+    connect [function]: returns a new praw.Reddit instance, called once per worker thread
+    workers [int]: number of threads
+    output: list of results, in the order of items
+    """
+    local = threading.local()
+
+    def run(item):
+        if not hasattr(local, 'reddit'):
+            local.reddit = connect()
+        return fetch(local.reddit, item)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(run, items))
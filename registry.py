@@ -0,0 +1,103 @@
+"""
+Cached registry of the registered wallets.
+
+users.json is kept in a local file and only downloaded again when the server
+says it changed (ETag / If-Modified-Since), so generating a round does not wait
+on ethtrader.github.io. The usernames are indexed once into a dict, and
+lookups ignore case like Reddit usernames do. With offline=True the local file
+is used as is, e.g. a users.json supplied by hand.
+"""
+import json
+import os
+
+import pandas as pd
+
+
+USERS_URL = 'https://ethtrader.github.io/donut.distribution/users.json'
+# Registered address that is not paid.
+EXCLUDED_ADDRESSES = ('0xf8b45423AFb4144FCe5a2910fFE124067704043a',)
+
+
+class WalletRegistry:
+    """
+    username -> address index of users.json.
+
+    inputs:
+    path [str]: local copy of users.json, created or refreshed unless offline
+    url [str]: where users.json is published
+    offline [bool]: only read the local file
+    """
+
+    def __init__(self, path='users.json', url=USERS_URL, offline=False):
+        self.path = path
+        self.url = url
+        if not offline:
+            self.refresh()
+        with open(path) as f:
+            self.build(json.load(f))
+
+    @property
+    def meta_path(self):
+        return self.path + '.meta.json'
+
+    def refresh(self):
+        """Downloads users.json if it changed since the local copy. Returns True if it was downloaded."""
+        import requests
+
+        headers = {}
+        if os.path.exists(self.path) and os.path.exists(self.meta_path):
+            with open(self.meta_path) as f:
+                meta = json.load(f)
+            if meta.get('etag'):
+                headers['If-None-Match'] = meta['etag']
+            if meta.get('last_modified'):
+                headers['If-Modified-Since'] = meta['last_modified']
+
+        try:
+            response = requests.get(self.url, headers=headers, timeout=30)
+            response.raise_for_status()
+        except requests.RequestException as e:
+            if not os.path.exists(self.path):
+                raise
+            print('Could not refresh ' + self.path + ', using the local copy: ' + str(e))
+            return False
+        if response.status_code == 304:
+            return False
+
+        tmp = self.path + '.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(response.content)
+        os.replace(tmp, self.path)
+        with open(self.meta_path, 'w') as f:
+            json.dump({'etag': response.headers.get('ETag'), 'last_modified': response.headers.get('Last-Modified')}, f)
+        return True
+
+    def build(self, users):
+        excluded = {a.lower() for a in EXCLUDED_ADDRESSES}
+        self.index = {}
+        for user in users:
+            if user['address'].lower() in excluded:
+                continue
+            # The first entry of a username wins.
+            self.index.setdefault(user['username'].lower(), user['address'])
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, username):
+        return username.lower() in self.index
+
+    def address(self, username, default=None):
+        return self.index.get(username.lower(), default)
+
+    def registered(self, usernames):
+        """The usernames that have a wallet, in the given order."""
+        return [u for u in usernames if u.lower() in self.index]
+
+    def addresses(self, usernames):
+        """Addresses of the given usernames, None for unregistered ones."""
+        return [self.index.get(u.lower()) for u in usernames]
+
+    def frame(self):
+        """username/blockchain_address DataFrame, with the usernames lowercased."""
+        return pd.DataFrame({'username': list(self.index), 'blockchain_address': list(self.index.values())})
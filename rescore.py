@@ -0,0 +1,69 @@
+"""
+Re-snapshot of the scores of a round.
+
+Scores in the day files are the ones seen when the day was mined. rescore_round
+refreshes them from the ids already stored in the round directory with
+/api/info lookups of 100 fullnames each, instead of walking the comment trees
+again.
+"""
+import os
+import shutil
+
+from reddit_scheduler import fetch_all
+from round_store import round_files, read_day, write_day, DAY_FILE
+
+
+PREFIXES = {'posts': 't3_', 'comments': 't1_', 'daily': 't1_'}
+BATCH = 100
+
+
+def lookup_scores(reddit, fullnames):
+    """Current score of each of the given fullnames (at most 100) that still exists."""
+    return {thing.fullname: thing.score for thing in reddit.info(fullnames=list(fullnames))}
+
+
+def rescore_round(round_dir, connect, workers=4, out_dir=None):
+    """
+    Refreshes the `score` column of the posts, comments and daily files of a round.
+
+    inputs:
+    round_dir [str]: round directory
+    connect [function]: returns a new praw.Reddit instance; give every instance the same
+                        reddit_scheduler budget to keep the lookups within the rate limit
+    workers [int]: number of lookups running at the same time
+    out_dir [str]: directory for the updated day files; None (default) updates them in place.
+                   pay2post files are copied there unchanged, so csv_generator can be run on it.
+    output: number of scores that changed
+    """
+    days = round_files(round_dir)
+    frames = {}
+    fullnames = []
+    for key in sorted(days):
+        for kind, path in days[key].items():
+            if kind not in PREFIXES:
+                continue
+            df = read_day(path)
+            df = df.drop(columns=[c for c in df.columns if c.startswith('Unnamed')])
+            frames[path] = (kind, key, df)
+            fullnames.extend(PREFIXES[kind] + df['id'])
+
+    batches = [fullnames[i:i + BATCH] for i in range(0, len(fullnames), BATCH)]
+    scores = {}
+    for found in fetch_all(lookup_scores, batches, connect, workers):
+        scores.update(found)
+
+    if out_dir is not None:
+        os.makedirs(out_dir, exist_ok=True)
+        for files in days.values():
+            if 'pay2post' in files:
+                shutil.copy(files['pay2post'], out_dir)
+
+    changed = 0
+    for path, (kind, key, df) in frames.items():
+        # Deleted or removed things are not returned by /api/info and keep their last score.
+        new = (PREFIXES[kind] + df['id']).map(scores).fillna(df['score']).astype(df['score'].dtype)
+        changed += int((new != df['score']).sum())
+        df['score'] = new
+        fmt = DAY_FILE.match(os.path.basename(path)).group(3)
+        write_day(df, round_dir if out_dir is None else out_dir, kind, key, fmt)
+    return changed
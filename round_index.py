@@ -0,0 +1,199 @@
+"""
+Per-user index of a round, for "why did I get X donuts" questions.
+
+round_index.sqlite, next to the day files, holds one row per post, comment and
+pay2post submission with its author, day, row in the day file, flair or
+thread, the upvotes it scored and whether the per-day cap excluded it. Lookups
+go through an author index (case-insensitive) instead of reading the round.
+Only the days whose files changed since they were indexed are read again.
+
+Lookup: python round_index.py <round_dir> <username>
+"""
+import json
+import os
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+import scoring
+from aggregates import file_hash
+from round_store import read_day, round_files
+
+
+INDEX = 'round_index.sqlite'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS posts (
+    day TEXT NOT NULL,
+    row INTEGER NOT NULL,
+    id TEXT,
+    author TEXT NOT NULL COLLATE NOCASE,
+    flair TEXT,
+    score INTEGER,
+    upvotes REAL
+);
+CREATE INDEX IF NOT EXISTS posts_by_author ON posts (author);
+CREATE TABLE IF NOT EXISTS comments (
+    day TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    row INTEGER NOT NULL,
+    id TEXT,
+    author TEXT NOT NULL COLLATE NOCASE,
+    submission TEXT,
+    upvotes REAL,
+    included INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS comments_by_author ON comments (author);
+CREATE TABLE IF NOT EXISTS pay2post (
+    day TEXT NOT NULL,
+    row INTEGER NOT NULL,
+    id TEXT,
+    author TEXT NOT NULL COLLATE NOCASE
+);
+CREATE INDEX IF NOT EXISTS pay2post_by_author ON pay2post (author);
+CREATE TABLE IF NOT EXISTS days (
+    day TEXT PRIMARY KEY,
+    sources TEXT NOT NULL
+);
+"""
+
+
+def index_path(round_dir):
+    return os.path.join(round_dir, INDEX)
+
+
+def connect(round_dir):
+    db = sqlite3.connect(index_path(round_dir))
+    db.executescript(SCHEMA)
+    return db
+
+
+def values(column):
+    """Column as a list of Python values, None for missing ones."""
+    return column.astype(object).where(column.notna(), None).tolist()
+
+
+def day_rows(key, files, capped=None, posts=None, limit=scoring.COMMENT_LIMIT):
+    """
+    Index rows of one day: (posts, comments, pay2post) lists of tuples.
+
+    capped and posts, as returned by scoring.score_day, are used instead of reading and capping the day again.
+    """
+    if posts is None:
+        posts = read_day(files.get('posts'), ['id', 'author', 'score', 'flair'], 'posts')
+    posts = posts[posts['author'].notna()]
+    upvotes = posts['flair'].map(scoring.FLAIR_WEIGHTS).fillna(1) * (posts['score'] - 1)
+    post_rows = list(zip([key] * len(posts), posts.index.tolist(), values(posts['id']), values(posts['author']),
+                         values(posts['flair']), posts['score'].astype(int).tolist(), upvotes.astype(float).tolist()))
+
+    if capped is None:
+        columns = ['id', 'author', 'score', 'date', 'submission']
+        comments = read_day(files.get('comments'), columns, 'comments')
+        daily = read_day(files.get('daily'), columns, 'daily')
+        capped = scoring.cap_comments(comments, daily, limit)
+    comment_rows = list(zip([key] * len(capped), np.where(capped['daily'], 'daily', 'comments').tolist(), capped['row'].astype(int).tolist(),
+                            values(capped['id']), values(capped['author']), values(capped['submission']),
+                            (capped['score'] - 1).astype(float).tolist(), capped['included'].astype(int).tolist()))
+
+    pay2post = read_day(files.get('pay2post'), ['id', 'username'], 'pay2post')
+    pay2post = pay2post[pay2post['username'].notna()]
+    pay2post_rows = list(zip([key] * len(pay2post), pay2post.index.tolist(), values(pay2post['id']), values(pay2post['username'])))
+    return post_rows, comment_rows, pay2post_rows
+
+
+def _day_rows(args):
+    """Process-pool worker: index rows of one day."""
+    return day_rows(*args)
+
+
+def update_index(round_dir, days=None, rows=None, workers=1):
+    """
+    Indexes the days of a round whose files changed since they were indexed.
+
+    inputs:
+    round_dir [str]: round directory
+    days [dict]: day files, as returned by round_store.round_files
+    rows [dict]: {date_key: day_rows} already built, e.g. by aggregates.round_aggregates from the days it scored
+    workers [int]: processes building the rows of the other changed days in parallel. Default is 1.
+    output: number of days (re)indexed
+    """
+    if days is None:
+        days = round_files(round_dir)
+    rows = dict(rows or {})
+    db = connect(round_dir)
+    indexed = dict(db.execute('SELECT day, sources FROM days'))
+    stale = {}
+    for key in sorted(days):
+        sources = json.dumps({kind: file_hash(path) for kind, path in sorted(days[key].items())})
+        if indexed.get(key) != sources:
+            stale[key] = sources
+
+    missing = [key for key in stale if key not in rows]
+    if workers > 1 and len(missing) > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=min(workers, len(missing))) as pool:
+            rows.update(zip(missing, pool.map(_day_rows, [(key, days[key]) for key in missing])))
+    else:
+        rows.update((key, day_rows(key, days[key])) for key in missing)
+
+    for key, sources in stale.items():
+        post_rows, comment_rows, pay2post_rows = rows[key]
+        with db:
+            for table in ('posts', 'comments', 'pay2post'):
+                db.execute('DELETE FROM ' + table + ' WHERE day = ?', (key,))
+            db.executemany('INSERT INTO posts VALUES (?, ?, ?, ?, ?, ?, ?)', post_rows)
+            db.executemany('INSERT INTO comments VALUES (?, ?, ?, ?, ?, ?, ?, ?)', comment_rows)
+            db.executemany('INSERT INTO pay2post VALUES (?, ?, ?, ?)', pay2post_rows)
+            db.execute('INSERT OR REPLACE INTO days (day, sources) VALUES (?, ?)', (key, sources))
+    # Days whose files were removed.
+    for key in set(indexed) - set(days):
+        with db:
+            for table in ('posts', 'comments', 'pay2post', 'days'):
+                db.execute('DELETE FROM ' + table + ' WHERE day = ?', (key,))
+    db.close()
+    return len(stale)
+
+
+def lookup(round_dir, username):
+    """
+    Breakdown of a user's round.
+
+    output: {'days', 'flairs', 'threads', 'comments', 'posts'} DataFrames; comments lists every comment with its
+    day, kind, row in the day file, thread and whether the per-day cap included it
+    """
+    db = connect(round_dir)
+    params = (username,)
+    by_day = [
+        pd.read_sql_query("""
+            SELECT day, SUM(kind = 'comments' AND included) AS comments, SUM(kind = 'daily' AND included) AS daily,
+                   SUM(NOT included) AS excluded, SUM(CASE WHEN included THEN upvotes ELSE 0 END) AS comment_upvotes
+            FROM comments WHERE author = ? GROUP BY day""", db, params=params, index_col='day'),
+        pd.read_sql_query('SELECT day, COUNT(*) AS posts, SUM(upvotes) AS post_upvotes FROM posts WHERE author = ? GROUP BY day', db, params=params, index_col='day'),
+        pd.read_sql_query('SELECT day, COUNT(*) AS pay2post FROM pay2post WHERE author = ? GROUP BY day', db, params=params, index_col='day'),
+    ]
+    result = {
+        'days': pd.concat(by_day, axis=1).fillna(0).sort_index().reset_index(),
+        'flairs': pd.read_sql_query("""
+            SELECT flair, COUNT(*) AS posts, SUM(score - 1) AS upvotes, SUM(upvotes) AS weighted_upvotes
+            FROM posts WHERE author = ? GROUP BY flair ORDER BY weighted_upvotes DESC""", db, params=params),
+        'threads': pd.read_sql_query("""
+            SELECT submission, COUNT(*) AS comments, SUM(NOT included) AS excluded,
+                   SUM(CASE WHEN included THEN upvotes ELSE 0 END) AS comment_upvotes
+            FROM comments WHERE author = ? GROUP BY submission ORDER BY comment_upvotes DESC""", db, params=params),
+        'comments': pd.read_sql_query('SELECT day, kind, row, id, submission, upvotes, included FROM comments WHERE author = ? ORDER BY day, kind, row', db, params=params),
+        'posts': pd.read_sql_query('SELECT day, row, id, flair, score, upvotes FROM posts WHERE author = ? ORDER BY day, row', db, params=params),
+    }
+    db.close()
+    return result
+
+
+if __name__ == '__main__':
+    import sys
+    round_dir, username = sys.argv[1], sys.argv[2]
+    if not os.path.exists(index_path(round_dir)):
+        update_index(round_dir)
+    with pd.option_context('display.max_rows', None, 'display.width', 200):
+        for name, table in lookup(round_dir, username).items():
+            if name not in ('comments', 'posts'):
+                print('\n' + name + ':\n' + (table.to_string(index=False) if len(table) else 'none'))
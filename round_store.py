@@ -0,0 +1,183 @@
+"""
+Storage of the round day files.
+
+Day files are written by csv_miner.py and pay2post.py either as csv (the
+default) or as parquet. Parquet keeps typed columns and lets the generator read
+only the columns it needs; it requires pyarrow.
+
+The published artifacts (round_N.csv and the _limited files) are always csv.
+"""
+import os
+import re
+
+import pandas as pd
+
+
+FORMATS = {'csv': '.csv', 'parquet': '.parquet'}
+
+# Column types of each kind of day file.
+SCHEMAS = {
+    'posts': {'id': 'string', 'score': 'int64', 'author': 'string', 'date': 'datetime64[ns]', 'comments': 'int64', 'flair': 'string'},
+    'comments': {'id': 'string', 'score': 'int64', 'author': 'string', 'date': 'datetime64[ns]', 'submission': 'string'},
+    'daily': {'id': 'string', 'score': 'int64', 'author': 'string', 'date': 'datetime64[ns]', 'submission': 'string'},
+    'pay2post': {'id': 'string', 'username': 'string', 'date': 'datetime64[ns]'},
+}
+
+DAY_FILE = re.compile(r'^(posts|comments|daily|pay2post)_(\d+)\.(csv|parquet)$')
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        raise ImportError("The parquet round store needs pyarrow, install it with `pip install pyarrow`.")
+
+
+def day_path(round_dir, kind, key, fmt='csv'):
+    """Path of the `kind` file of day `key` in round_dir."""
+    return os.path.join(round_dir, kind + '_' + key + FORMATS[fmt])
+
+
+def day_key(date):
+    """Date key used in the day file names, e.g. 2024111 for 2024-01-11."""
+    return str(date.year) + str(date.month) + str(date.day)
+
+
+def round_files(datadir):
+    """
+    Pairs the day files of a round by the date in their file name.
+    When a day file exists both as csv and parquet the parquet one is used.
+
+    inputs: datadir [str]
+    output: {date_key: {kind: path}}, kind in posts/comments/daily/pay2post
+    """
+    days = {}
+    for name in sorted(os.listdir(datadir)):
+        match = DAY_FILE.match(name)
+        if match:
+            kind, key, ext = match.groups()
+            if ext == 'csv' and kind in days.get(key, {}):
+                continue
+            days.setdefault(key, {})[kind] = os.path.join(datadir, name)
+    return days
+
+
+def typed(df, kind):
+    """Casts the known columns of a day frame to their schema types."""
+    for column, dtype in SCHEMAS[kind].items():
+        if column not in df:
+            continue
+        if dtype.startswith('datetime'):
+            df[column] = pd.to_datetime(df[column])
+        else:
+            df[column] = df[column].astype(dtype)
+    return df
+
+
+def read_day(path, columns=None, kind=None):
+    """
+    Reads a day file, csv or parquet, with typed columns.
+
+    inputs:
+    path [str or None]: file to read; a missing file gives an empty frame
+    columns [list]: columns to read, None for all of them
+    kind [str]: posts/comments/daily/pay2post, taken from the file name if not given
+    output: DataFrame
+    """
+    if kind is None and path is not None:
+        kind = DAY_FILE.match(os.path.basename(path)).group(1)
+    if path is None:
+        df = pd.DataFrame(columns=columns)
+    elif path.endswith('.parquet'):
+        _require_pyarrow()
+        if columns is not None:
+            # An empty day has no columns; the missing ones are added by the reindex below.
+            import pyarrow.parquet as pq
+            present = pq.read_schema(path).names
+            columns_read = [c for c in columns if c in present]
+        else:
+            columns_read = None
+        df = pd.read_parquet(path, columns=columns_read, memory_map=True)
+    else:
+        usecols = None if columns is None else (lambda c: c in columns)
+        df = pd.read_csv(path, usecols=usecols)
+    if columns is not None:
+        df = df.reindex(columns=columns)
+    elif kind and any(c not in df for c in SCHEMAS[kind]):
+        # e.g. the header-only file pd.DataFrame([]).to_csv wrote for an empty day
+        df = df.reindex(columns=list(df.columns) + [c for c in SCHEMAS[kind] if c not in df])
+    return typed(df, kind) if kind else df
+
+
+def iter_day(path, columns, kind=None, chunksize=100000):
+    """
+    Reads a day file in chunks of at most `chunksize` rows, typed as read_day.
+
+    inputs: as read_day; a missing file gives no chunks
+    output: iterator of DataFrames
+    """
+    if path is None:
+        return
+    if kind is None:
+        kind = DAY_FILE.match(os.path.basename(path)).group(1)
+    if path.endswith('.parquet'):
+        _require_pyarrow()
+        import pyarrow.parquet as pq
+        parquet = pq.ParquetFile(path)
+        present = [c for c in columns if c in parquet.schema_arrow.names]
+        chunks = (batch.to_pandas() for batch in parquet.iter_batches(batch_size=chunksize, columns=present))
+    else:
+        chunks = pd.read_csv(path, usecols=lambda c: c in columns, chunksize=chunksize)
+    for df in chunks:
+        yield typed(df.reindex(columns=columns), kind)
+
+
+def write_day(df, round_dir, kind, key, fmt='csv'):
+    """
+    Writes a day file in the given format and returns its path.
+
+    csv files keep the layout the miners always wrote: posts, comments and
+    daily files with a pandas index column, pay2post without it. An empty
+    frame is written with the SCHEMAS columns of its kind.
+    """
+    path = day_path(round_dir, kind, key, fmt)
+    if df.empty:
+        # A day without rows still gets the columns of its kind, e.g. pd.DataFrame([]) for a day without a daily thread.
+        df = df.reindex(columns=list(df.columns) + [c for c in SCHEMAS[kind] if c not in df.columns])
+    if fmt == 'parquet':
+        _require_pyarrow()
+        typed(df.copy(), kind).to_parquet(path, index=False)
+    else:
+        df.to_csv(path, index=(kind != 'pay2post'))
+    return path
+
+
+def convert_round(round_dir, fmt='parquet', remove=False):
+    """
+    Converts the day files of an existing round directory to another format.
+
+    inputs:
+    round_dir [str]: directory with the day files
+    fmt [str]: target format, parquet or csv
+    remove [bool]: delete the source files after converting them
+    output: list of written paths
+    """
+    written = []
+    for name in sorted(os.listdir(round_dir)):
+        match = DAY_FILE.match(name)
+        if not match or match.group(3) == fmt:
+            continue
+        kind, key, _ = match.groups()
+        source = os.path.join(round_dir, name)
+        df = read_day(source, kind=kind)
+        df = df.drop(columns=[c for c in df.columns if c.startswith('Unnamed')])
+        written.append(write_day(df, round_dir, kind, key, fmt))
+        if remove:
+            os.remove(source)
+    return written
+
+
+if __name__ == '__main__':
+    import sys
+    for path in convert_round(sys.argv[1], *sys.argv[2:3]):
+        print(path)
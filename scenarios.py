@@ -0,0 +1,138 @@
+"""
+What-if scoring of a round under several sets of parameters.
+
+Governance proposals change the pools, the flair weights, the daily-thread
+factor, the per-day comment cap or the pay2post cost. The round is loaded once
+as a CompactRound and every scenario is scored from the same arrays: post
+upvotes are summed per author and flair once and weighted for all scenarios
+with one matrix product, and comment upvotes are summed once per distinct cap.
+
+A scenario only lists the parameters it changes:
+
+    {"current": {}, "no daily halving": {"daily_factor": 1}, "OC x3": {"flair_weights": {"OC - Original Content": 3}}}
+
+Run with: python scenarios.py <round_dir> scenarios.json [comparison.csv]
+"""
+import numpy as np
+import pandas as pd
+
+import scoring
+from compact import CompactRound, FLAIRS
+
+
+def defaults():
+    return {
+        'post_pool': scoring.POST_POOL,
+        'comment_pool': scoring.COMMENT_POOL,
+        'flair_weights': scoring.FLAIR_WEIGHTS,
+        'daily_factor': scoring.DAILY_FACTOR,
+        'limit': scoring.COMMENT_LIMIT,
+        'pay2post_cost': scoring.PAY2POST_COST,
+    }
+
+
+def resolve(scenario):
+    """Full parameter set of a scenario; flair_weights are merged into the current ones."""
+    params = defaults()
+    for name, value in scenario.items():
+        if name not in params:
+            raise KeyError('Unknown scenario parameter: ' + name)
+        params[name] = dict(params[name], **value) if name == 'flair_weights' else value
+    return params
+
+
+def scenario_points(round_data, users, scenarios):
+    """
+    Points of every user under every scenario.
+
+    inputs:
+    round_data [CompactRound]: the round
+    users [list]: registered usernames
+    scenarios [dict]: {name: parameters that differ from the current ones}
+    output: DataFrame indexed by username, one column of points per scenario
+    """
+    names = list(scenarios)
+    params = [resolve(scenarios[name]) for name in names]
+    n = len(round_data.authors)
+    ids = round_data.authors.lookup(users)
+    known = ids >= 0
+    ids = ids[known]
+
+    # Post upvotes per author and flair, weighted for all scenarios at once.
+    posts = round_data.posts
+    by_flair = np.zeros((n, len(FLAIRS) + 1))
+    np.add.at(by_flair, (posts['author'], posts['flair']), posts['score'] - 1)
+    weights = np.array([[p['flair_weights'].get(flair, 1) for p in params] for flair in FLAIRS] + [[1] * len(params)], dtype=float)
+    pscores = (by_flair @ weights)[ids]
+
+    # Comment upvotes: regular and daily sums per distinct cap, scaled by each daily factor.
+    comments = round_data.comments
+    cscores = np.empty((len(ids), len(params)))
+    sums = {}
+    for j, p in enumerate(params):
+        if p['limit'] not in sums:
+            kept = round_data.included(p['limit'])
+            regular, daily = kept & ~comments['daily'], kept & comments['daily']
+            sums[p['limit']] = (
+                np.bincount(comments['author'][regular], weights=comments['score'][regular] - 1, minlength=n)[ids],
+                np.bincount(comments['author'][daily], weights=comments['score'][daily], minlength=n)[ids],
+                np.bincount(comments['author'][daily], minlength=n)[ids],
+            )
+        regular, daily, count = sums[p['limit']]
+        cscores[:, j] = regular + p['daily_factor'] * daily - count
+
+    p2p = np.bincount(round_data.pay2post['author'], minlength=n)[ids]
+
+    post_pool = np.array([p['post_pool'] for p in params], dtype=float)
+    comment_pool = np.array([p['comment_pool'] for p in params], dtype=float)
+    cost = np.array([p['pay2post_cost'] for p in params], dtype=float)
+    pratio = post_pool / pscores.clip(min=0).sum(axis=0)
+    cratio = comment_pool / cscores.clip(min=0).sum(axis=0)
+    points = pratio * pscores.clip(min=0) + cratio * cscores.clip(min=0) - p2p[:, None] * cost * pratio
+
+    # Registered users without any activity score nothing.
+    result = pd.DataFrame(0.0, index=pd.Index(users, name='username'), columns=names)
+    result.loc[np.asarray(users)[known]] = points
+    return result
+
+
+def compare(points, baseline=None):
+    """
+    Comparison table of the scenarios.
+
+    inputs:
+    points [DataFrame]: as returned by scenario_points
+    baseline [str]: scenario the others are compared to, the first one if not given
+    output: (per-user table with each scenario's points and difference to the baseline, per-scenario totals)
+    """
+    baseline = points.columns[0] if baseline is None else baseline
+    table = points.copy()
+    for name in points.columns:
+        if name != baseline:
+            table[name + ' diff'] = points[name] - points[baseline]
+    table = table[(points != 0).any(axis=1)].sort_values(baseline, ascending=False)
+    totals = pd.DataFrame({
+        'total_points': points.sum(),
+        'users_paid': (points > 0).sum(),
+        'max_points': points.max(),
+        'users_gaining': (points.sub(points[baseline], axis=0) > 1e-9).sum(),
+        'users_losing': (points.sub(points[baseline], axis=0) < -1e-9).sum(),
+    })
+    return table, totals
+
+
+if __name__ == '__main__':
+    import json
+    import sys
+    from registry import WalletRegistry
+    from round_store import round_files
+
+    round_dir = sys.argv[1]
+    with open(sys.argv[2]) as f:
+        scenarios = json.load(f)
+    round_data = CompactRound.load(round_files(round_dir))
+    users = WalletRegistry().registered(round_data.totals().index)
+    table, totals = compare(scenario_points(round_data, users, scenarios))
+    print(totals.to_string())
+    if len(sys.argv) > 3:
+        table.to_csv(sys.argv[3])
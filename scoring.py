@@ -0,0 +1,188 @@
+"""
+Scoring engine for the round csv.
+
+Every day file is loaded once and all users are scored together with grouped
+operations, instead of re-reading the round once per user.
+
+Upvotes are summed as whole numbers of units (half upvotes for comments, as the
+daily thread counts half, twentieths for posts with the flair weights), which
+are exact whatever order the rows are added in. The in-memory, compact and
+streaming paths therefore write the same round csv; units are turned into
+upvotes only once summed over the round, by upvotes().
+"""
+import math
+import os
+from fractions import Fraction
+
+import numpy as np
+import pandas as pd
+
+from round_store import read_day, DAY_FILE
+
+
+POST_POOL = 510000
+COMMENT_POOL = 340000
+COMMENT_LIMIT = 50
+DAILY_FACTOR = 0.5
+PAY2POST_COST = 2.5
+FLAIR_WEIGHTS = {
+    "Media": 0.25,
+    "Comedy": 0.25,
+    "Self Story": 0.25,
+    "OC - Original Content": 2,
+    "Question": 0.1,
+    "Link": 0.75,
+}
+
+
+def units(values):
+    """Smallest n for which every value times n is a whole number, e.g. 20 for 0.25, 0.1 and 2."""
+    return math.lcm(*(Fraction(str(v)).denominator for v in values))
+
+
+COMMENT_UNITS = units([1, DAILY_FACTOR])
+POST_UNITS = units(list(FLAIR_WEIGHTS.values()) + [1])
+
+
+def cap_comments(comments, daily, limit=COMMENT_LIMIT):
+    """
+    Applies the per-day comment cap to all authors at once.
+
+    Comments and daily-thread comments of a day are merged, daily scores are
+    halved and only the first `limit` comments of each author, ordered by
+    date, are kept.
+
+    inputs: comments [DataFrame], daily [DataFrame], limit [int]
+    output: merged DataFrame with `daily`, `row` (position in its day file) and `included` columns
+    """
+    c = comments.assign(daily=False, row=np.arange(len(comments)))
+    d = daily.assign(daily=True, row=np.arange(len(daily)), score=daily['score'] * DAILY_FACTOR)
+    merged = pd.concat([c, d], ignore_index=True)
+    merged = merged[merged['author'].notna()]
+    merged = merged.sort_values('date', kind='stable')
+    merged['included'] = merged.groupby('author', sort=False).cumcount() < limit
+    return merged.sort_index()
+
+
+def comment_totals(capped):
+    """Per-author comment count and upvotes, in COMMENT_UNITS, over the included comments."""
+    kept = capped[capped['included']]
+    units = ((kept['score'] - 1) * COMMENT_UNITS).round().astype('int64')
+    return pd.DataFrame({'comments': kept.groupby('author').size(), 'comment_units': units.groupby(kept['author']).sum()})
+
+
+def post_totals(posts):
+    """Per-author post count and flair-weighted upvotes, in POST_UNITS."""
+    posts = posts[posts['author'].notna()]
+    weights = (posts['flair'].map(FLAIR_WEIGHTS).fillna(1) * POST_UNITS).round().astype('int64')
+    units = weights * (posts['score'] - 1)
+    return pd.DataFrame({'posts': posts.groupby('author').size(), 'post_units': units.groupby(posts['author']).sum()})
+
+
+def upvotes(totals):
+    """
+    Turns summed per-author totals in units into upvotes.
+
+    inputs: totals [DataFrame], indexed by author with comments/comment_units/posts/post_units
+    output: DataFrame indexed by author with comments/comment_upvotes/posts/post_upvotes
+    """
+    return pd.DataFrame({
+        'comments': totals['comments'],
+        'comment_upvotes': totals['comment_units'] / COMMENT_UNITS,
+        'posts': totals['posts'],
+        'post_upvotes': totals['post_units'] / POST_UNITS,
+    }, index=totals.index)
+
+
+def score_day(files, limit=COMMENT_LIMIT):
+    """
+    Scores a single day of the round.
+
+    inputs: files [dict], the paths of the day as returned by round_files
+    output: (per-author totals in units [DataFrame], capped comments [DataFrame], posts [DataFrame]); the frames
+    keep the columns round_index.day_rows needs, so the day can be indexed without reading it again
+    """
+    comments = read_day(files.get('comments'), ['id', 'author', 'score', 'date', 'submission'], 'comments')
+    daily = read_day(files.get('daily'), ['id', 'author', 'score', 'date', 'submission'], 'daily')
+    posts = read_day(files.get('posts'), ['id', 'author', 'score', 'flair'], 'posts')
+
+    capped = cap_comments(comments, daily, limit)
+    totals = pd.concat([comment_totals(capped), post_totals(posts)], axis=1).fillna(0).astype('int64')
+    return totals, capped, posts
+
+
+def limited_path(path):
+    """Path of the `_limited` copy of a comments or daily file."""
+    return os.path.splitext(path)[0]+'_limited.csv'
+
+
+def included_path(files):
+    """Path of the `included_DATE.csv` mask of a day."""
+    path = files.get('comments', files.get('daily'))
+    key = DAY_FILE.match(os.path.basename(path)).group(2)
+    return os.path.join(os.path.dirname(path), 'included_'+key+'.csv')
+
+
+def limited_outputs(files, mode='copy'):
+    """Paths write_limited writes for a day in the given mode."""
+    if mode == 'mask':
+        return [included_path(files)] if 'comments' in files or 'daily' in files else []
+    if mode == 'copy':
+        return [limited_path(files[kind]) for kind in ('comments', 'daily') if kind in files]
+    return []
+
+
+def write_limited(files, capped, mode='copy'):
+    """
+    Writes the day's comment cap, once for all authors.
+
+    mode 'copy' writes the `_limited` copies of the day's comment files, without the comments beyond the daily cap,
+    with daily-thread scores halved. mode 'mask' only writes `included_DATE.csv`, with the id, daily and included
+    columns of every comment of the day that has an author, instead of copying the files.
+    """
+    if mode == 'mask':
+        if 'comments' in files or 'daily' in files:
+            capped[['id', 'daily', 'included']].to_csv(included_path(files), index=False)
+        return
+    excluded = capped[~capped['included']]
+    if 'comments' in files:
+        c = read_day(files['comments'])
+        c[~c.id.isin(excluded['id'][~excluded['daily']])].to_csv(limited_path(files['comments']), index=False)
+    if 'daily' in files:
+        d = read_day(files['daily'])
+        d['score'] = d['score']*DAILY_FACTOR
+        d[~d.id.isin(excluded['id'][excluded['daily']])].to_csv(limited_path(files['daily']), index=False)
+
+
+def pay2post_counts(days):
+    """Number of pay2post submissions per username over the round."""
+    frames = [read_day(files['pay2post'], ['username'], 'pay2post') for files in days.values() if 'pay2post' in files]
+    if not frames:
+        return pd.DataFrame({'username': [], 'total_posts': []})
+    counts = pd.concat(frames)['username'].value_counts()
+    return pd.DataFrame({'username': counts.index.to_numpy(dtype=object), 'total_posts': counts.to_numpy(dtype=int)})
+
+
+def round_table(totals, users, p2p):
+    """
+    Builds the final per-user table from the summed per-author totals.
+
+    inputs:
+    totals [DataFrame]: indexed by author, with comments/comment_upvotes/posts/post_upvotes
+    users [array]: registered usernames, in output order
+    p2p [DataFrame]: username/total_posts
+    output: DataFrame with the round_N.csv columns (without the wallet)
+    """
+    totals = totals.reindex(users).fillna(0)
+    cscores = totals['comment_upvotes'].to_numpy(dtype=float)
+    pscores = totals['post_upvotes'].to_numpy(dtype=float)
+
+    pratio = POST_POOL / np.sum(pscores.clip(min=0))
+    cratio = COMMENT_POOL / np.sum(cscores.clip(min=0))
+    userscores = pratio * pscores.clip(min=0) + cratio * cscores.clip(min=0)
+
+    df = pd.DataFrame({'username': users, 'comments': totals['comments'].to_numpy().astype(int), 'comment_upvotes': cscores, 'comment_score': cscores * cratio, 'posts': totals['posts'].to_numpy().astype(int), 'post_upvotes': pscores, 'post_score': pscores * pratio})
+    df = pd.merge(df, p2p, how='left', on=['username']).fillna(0)
+    df['pay2post'] = -df['total_posts'] * PAY2POST_COST * pratio
+    df['points'] = userscores + df['pay2post']
+    return df
@@ -0,0 +1,428 @@
+"""
+Local stand-ins for Reddit, users.json, Etherscan and the Arbitrum RPC.
+
+A SyntheticRound generates, from a seed, the submissions, comment trees, daily
+threads and pay2post mentions of a round plus the users.json of its authors,
+and serves them through a FakeReddit with the parts of the praw interface the
+miners use. A SyntheticChain generates DONUT and membership NFT transfers for a
+set of wallets and serves them through a FakeSession (Etherscan pages and
+JSON-RPC balanceOf batches) and a FakeWeb3. Every request a real client would
+send is counted in `calls`, so the same code paths can be timed and their API
+usage compared without network access. See benchmark.py.
+"""
+import json
+import os
+import random
+from collections import Counter
+from datetime import datetime, timedelta
+
+import pandas as pd
+from praw.models import MoreComments
+
+from round_store import day_key, write_day
+
+
+LISTING_PAGE = 100
+# Comments shown with a submission before the rest is folded into MoreComments, and children per MoreComments.
+SHOWN_COMMENTS = 200
+MORE_CHILDREN = 100
+FLAIRS = ['Media', 'Comedy', 'Self Story', 'OC - Original Content', 'Question', 'Link', 'Discussion', None]
+
+
+class Redditor(str):
+    """Author name that also has the .name of a praw Redditor."""
+
+    @property
+    def name(self):
+        return str(self)
+
+
+class Comment:
+    def __init__(self, id, score, author, created_utc, submission):
+        self.id = id
+        self.fullname = 't1_' + id
+        self.score = score
+        self.author = author
+        self.created_utc = created_utc
+        self.submission = submission
+
+
+class CommentForest:
+    def __init__(self, items, calls):
+        self.items = items
+        self.calls = calls
+
+    def replace_more(self, limit=None):
+        expanded = []
+        for item in self.items:
+            if isinstance(item, FakeMoreComments):
+                expanded.extend(item.comments().items)
+            else:
+                expanded.append(item)
+        self.items = expanded
+        return []
+
+    def list(self):
+        return list(self.items)
+
+
+class FakeMoreComments(MoreComments):
+    """MoreComments whose children are served locally, one counted morechildren request per expansion."""
+
+    def __init__(self, reddit, submission, children):
+        super().__init__(reddit, {'id': submission.id + '_more_' + children[0].id, 'name': 't1_' + children[0].id,
+                                  'parent_id': submission.fullname, 'count': len(children),
+                                  'children': [c.id for c in children]})
+        self.submission = submission
+        self.loaded = children
+
+    def comments(self, update=True):
+        self._reddit.calls['morechildren'] += 1
+        return CommentForest(list(self.loaded), self._reddit.calls)
+
+
+class Submission:
+    def __init__(self, reddit, id, score, author, created_utc, flair, comments):
+        self.reddit = reddit
+        self.id = id
+        self.fullname = 't3_' + id
+        self.score = score
+        self.author = author
+        self.created_utc = created_utc
+        self.link_flair_text = flair
+        self.comment_sort = 'confidence'
+        self.num_comments = len(comments)
+        self.all_comments = comments
+        self.forest = None
+
+    def __str__(self):
+        return self.id
+
+    @property
+    def comments(self):
+        # The first access fetches the submission page with its first comments.
+        if self.forest is None:
+            self.reddit.calls['comments'] += 1
+            shown = list(self.all_comments[:SHOWN_COMMENTS])
+            rest = self.all_comments[SHOWN_COMMENTS:]
+            shown += [FakeMoreComments(self.reddit, self, rest[i:i + MORE_CHILDREN]) for i in range(0, len(rest), MORE_CHILDREN)]
+            self.forest = CommentForest(shown, self.reddit.calls)
+        return self.forest
+
+
+class Listing:
+    """Iterator over things, counting one request per page, with praw's `yielded`."""
+
+    def __init__(self, things, calls, kind, limit=None):
+        self.things = things if limit is None else things[:limit]
+        self.calls = calls
+        self.kind = kind
+        self.yielded = 0
+
+    def __iter__(self):
+        for thing in self.things:
+            if self.yielded % LISTING_PAGE == 0:
+                self.calls[self.kind] += 1
+            self.yielded += 1
+            yield thing
+
+
+class Mention:
+    def __init__(self, id, body, submission, created_utc):
+        self.id = id
+        self.body = body
+        self.submission = submission
+        self.created_utc = created_utc
+
+
+class Subreddit:
+    def __init__(self, reddit, name):
+        self.reddit = reddit
+        self.display_name = name
+
+    def new(self, limit=None):
+        return Listing(self.reddit.submissions, self.reddit.calls, 'listing', limit)
+
+
+class Inbox:
+    def __init__(self, reddit):
+        self.reddit = reddit
+
+    def mentions(self, limit=None):
+        return Listing(self.reddit.mentions, self.reddit.calls, 'inbox', limit)
+
+
+class FakeReddit:
+    """praw.Reddit stand-in serving a SyntheticRound."""
+
+    def __init__(self, calls=None):
+        self.calls = Counter() if calls is None else calls
+        self.submissions = []
+        self.mentions = []
+        self.things = {}
+        self.inbox = Inbox(self)
+
+    def subreddit(self, name):
+        return Subreddit(self, name)
+
+    def submission(self, id):
+        return self.things['t3_' + id]
+
+    def post(self, path, data=None):
+        # Only morechildren, sent by the MoreComments restored from a daily_harvest checkpoint.
+        self.calls['morechildren'] += 1
+        return [self.things['t1_' + id] for id in data['children'].split(',')]
+
+    def info(self, fullnames):
+        for i in range(0, len(fullnames), 100):
+            self.calls['info'] += 1
+            for fullname in fullnames[i:i + 100]:
+                if fullname in self.things:
+                    yield self.things[fullname]
+
+
+class SyntheticRound:
+    """
+    A deterministic synthetic round.
+
+    inputs:
+    users [int]: number of authors
+    days [int]: number of days, ending yesterday
+    posts [int]: submissions per day, besides the daily thread
+    comments [int]: comments per day over the submissions
+    daily [int]: comments per day in the daily thread
+    registered [float]: share of the authors in users.json
+    seed [int]
+    """
+
+    def __init__(self, users=200, days=3, posts=50, comments=2000, daily=1000, registered=0.8, seed=1):
+        self.rnd = random.Random(seed)
+        self.authors = [Redditor('user%d' % i) for i in range(users)]
+        self.registered = registered
+        self.calls = Counter()
+        self.reddit_data = FakeReddit(self.calls)
+        today = datetime.today()
+        self.start = datetime(today.year, today.month, today.day) - timedelta(days=days)
+        self.days = [self.start + timedelta(days=d) for d in range(days)]
+        for day in self.days:
+            self.make_day(day, posts, comments, daily)
+        # /new and the inbox list the newest first.
+        self.reddit_data.submissions.sort(key=lambda s: -s.created_utc)
+        self.reddit_data.mentions.sort(key=lambda m: -m.created_utc)
+
+    def author(self):
+        # A few authors write most of the comments, as on the sub.
+        return self.authors[min(int(self.rnd.paretovariate(1.2)) - 1, len(self.authors) - 1)] if self.rnd.random() < 0.7 else self.rnd.choice(self.authors)
+
+    def when(self, day):
+        return (day + timedelta(seconds=self.rnd.randrange(86400))).timestamp()
+
+    def thread(self, id, author, created, flair, n, day):
+        reddit = self.reddit_data
+        submission = Submission(reddit, id, self.rnd.randint(-3, 80), author, created, flair, [])
+        comments = [Comment('%sc%d' % (id, i), self.rnd.randint(-5, 40), self.author(), self.when(day), submission) for i in range(n)]
+        submission.all_comments = comments
+        submission.num_comments = n
+        reddit.submissions.append(submission)
+        reddit.things[submission.fullname] = submission
+        reddit.things.update((c.fullname, c) for c in comments)
+        return submission
+
+    def make_day(self, day, posts, comments, daily):
+        prefix = day_key(day)
+        self.thread('d' + prefix, Redditor('AutoModerator'), day.timestamp() + 60, 'Daily Discussion', daily, day)
+        per_post = [0] * posts
+        for _ in range(comments):
+            per_post[self.rnd.randrange(posts)] += 1
+        for i in range(posts):
+            author = self.author()
+            submission = self.thread('p%s_%d' % (prefix, i), author, self.when(day), self.rnd.choice(FLAIRS), per_post[i], day)
+            body = str(author) + ', thanks for your submission.'
+            self.reddit_data.mentions.append(Mention('m' + submission.id, body, submission, submission.created_utc + 5))
+
+    def reddit(self):
+        return self.reddit_data
+
+    def users_json(self, path):
+        """Writes the users.json of the registered authors and returns its path."""
+        registered = self.authors[:int(len(self.authors) * self.registered)]
+        with open(path, 'w') as f:
+            json.dump([{'username': str(a), 'address': '0x%040x' % (i + 1)} for i, a in enumerate(registered)], f)
+        return path
+
+    def write_round(self, round_dir, fmt='csv'):
+        """Writes the day files of the round as the miners would."""
+        os.makedirs(round_dir, exist_ok=True)
+        submissions = self.reddit_data.submissions
+        for day in self.days:
+            key = day_key(day)
+            begin, end = day.timestamp(), (day + timedelta(days=1)).timestamp()
+            todays = [s for s in submissions if begin <= s.created_utc < end]
+            posts = pd.DataFrame([{'id': s.id, 'score': s.score, 'author': s.author.name, 'date': datetime.fromtimestamp(s.created_utc),
+                                   'comments': s.num_comments, 'flair': s.link_flair_text} for s in todays])
+            write_day(posts, round_dir, 'posts', key, fmt)
+            rows = {'comments': [], 'daily': []}
+            for s in todays:
+                kind = 'daily' if s.author == 'AutoModerator' else 'comments'
+                rows[kind] += [{'id': c.id, 'score': c.score, 'author': str(c.author), 'date': datetime.fromtimestamp(c.created_utc),
+                                'submission': s.id} for c in s.all_comments]
+            for kind in ('comments', 'daily'):
+                write_day(pd.DataFrame(rows[kind]), round_dir, kind, key, fmt)
+            pay2post = pd.DataFrame([{'id': s.id, 'username': s.author.name, 'date': datetime.fromtimestamp(s.created_utc)}
+                                     for s in todays if s.author != 'AutoModerator'])
+            write_day(pay2post, round_dir, 'pay2post', key, fmt)
+
+
+class Response:
+    def __init__(self, data, status_code=200):
+        self.data = data
+        self.status_code = status_code
+
+    def json(self):
+        return self.data
+
+    @property
+    def content(self):
+        return json.dumps(self.data).encode()
+
+    def raise_for_status(self):
+        pass
+
+
+class FakeSession:
+    """requests.Session stand-in answering Etherscan transfer queries and JSON-RPC balanceOf batches."""
+
+    def __init__(self, chain):
+        self.chain = chain
+
+    def get(self, url, params=None, **kwargs):
+        chain = self.chain
+        chain.calls['etherscan:' + params['action']] += 1
+        address = params.get('address', '').lower()
+        rows = chain.by_address(params['action'], address) if address else getattr(chain, params['action'])
+        contract = params.get('contractaddress', '').lower()
+        start = int(params['startblock'])
+        found = [tx for tx in rows if int(tx['blockNumber']) >= start
+                 and (not address or address in (tx['from'].lower(), tx['to'].lower()))
+                 and (not contract or tx['contractAddress'].lower() == contract)]
+        offset, page = params['offset'], params['page']
+        if page * offset > 10000:
+            return Response({'status': '0', 'message': 'Result window is too large', 'result': []})
+        found = found[(page - 1) * offset:page * offset]
+        if not found:
+            return Response({'status': '0', 'message': 'No transactions found', 'result': []})
+        return Response({'status': '1', 'message': 'OK', 'result': found})
+
+    def post(self, url, json=None, **kwargs):
+        self.chain.calls['rpc_batch'] += 1
+        self.chain.calls['eth_call'] += len(json)
+        return Response([{'jsonrpc': '2.0', 'id': item['id'], 'result': hex(self.chain.raw_balance('0x' + item['params'][0]['data'][-40:]))}
+                         for item in json])
+
+
+class Call:
+    def __init__(self, chain, name, value):
+        self.chain = chain
+        self.name = name
+        self.value = value
+
+    def call(self):
+        self.chain.calls['eth_call:' + self.name] += 1
+        return self.value
+
+
+class FakeWeb3:
+    """Web3 stand-in whose contracts answer balanceOf and decimals from the SyntheticChain."""
+
+    def __init__(self, chain):
+        chain_ = chain
+
+        class Functions:
+            def balanceOf(self, address):
+                return Call(chain_, 'balanceOf', chain_.raw_balance(address))
+
+            def decimals(self):
+                return Call(chain_, 'decimals', 18)
+
+        class Contract:
+            functions = Functions()
+
+        class Eth:
+            def contract(self, address=None, abi=None):
+                return Contract()
+
+        self.eth = Eth()
+
+    def is_connected(self):
+        return True
+
+
+class SyntheticChain:
+    """
+    Deterministic DONUT and membership NFT transfers of a set of wallets.
+
+    inputs:
+    wallets [list]: wallet addresses
+    transfers [int]: token transfers per wallet
+    seed [int]
+    """
+
+    def __init__(self, wallets, transfers=200, seed=1):
+        import compute_multiplier as cm
+
+        self.cm = cm
+        self.calls = Counter()
+        rnd = random.Random(seed)
+        origin, lp, token = cm.ORIGIN_WALLET, cm.LP_ADDRESS, cm.TOKEN_CONTRACT
+        self.tokentx, self.tokennfttx = [], []
+        block = 1000
+        for n in range(transfers):
+            for wallet in wallets:
+                block += rnd.randint(0, 2)
+                kind = rnd.choice(['from_origin', 'from_origin', 'to_origin', 'to_lp', 'from_lp', 'payment', 'other'])
+                sender, recipient = {'from_origin': (origin, wallet), 'to_origin': (wallet, origin), 'to_lp': (wallet, lp),
+                                     'from_lp': (lp, wallet), 'payment': (wallet, '0x' + 'de' * 20), 'other': ('0x' + 'ab' * 20, wallet)}[kind]
+                tx = {'blockNumber': str(block), 'timeStamp': str(1600000000 + block), 'hash': '0x%x' % len(self.tokentx),
+                      'from': sender, 'to': recipient, 'contractAddress': token.lower(), 'value': str(rnd.randint(1, 10 ** 21)),
+                      'tokenName': 'Donut', 'tokenDecimal': '18'}
+                self.tokentx.append(tx)
+                if kind == 'payment' and rnd.random() < 0.2:
+                    self.tokennfttx.append({'blockNumber': str(block + rnd.randint(-3, 3)), 'hash': '0xn%x' % len(self.tokennfttx),
+                                            'from': '0x0000000000000000000000000000000000000000', 'to': wallet,
+                                            'contractAddress': '0x' + 'ee' * 20, 'tokenName': 'EthTrader Membership', 'tokenDecimal': '0'})
+        self.tokennfttx.sort(key=lambda tx: int(tx['blockNumber']))
+        self.index = {}
+        self.balances = Counter()
+        for tx in self.tokentx:
+            self.balances[tx['to'].lower()] += int(tx['value'])
+            self.balances[tx['from'].lower()] -= int(tx['value'])
+
+    def by_address(self, action, address):
+        """Transfers from or to an address, oldest first."""
+        if action not in self.index:
+            index = self.index[action] = {}
+            for tx in getattr(self, action):
+                index.setdefault(tx['from'].lower(), []).append(tx)
+                if tx['to'].lower() != tx['from'].lower():
+                    index.setdefault(tx['to'].lower(), []).append(tx)
+        return self.index[action].get(address, [])
+
+    def raw_balance(self, address):
+        return max(0, self.balances[address.lower()])
+
+    def install(self):
+        """Points compute_multiplier at the stand-ins. Returns a function that restores it."""
+        cm = self.cm
+        saved = cm.SESSION, cm.get_w3, cm.get_api_key
+        cm.SESSION = FakeSession(self)
+        w3 = FakeWeb3(self)
+        cm.get_w3 = lambda: w3
+        cm.get_api_key = lambda: 'standin'
+        cm.get_contract.cache_clear()
+        cm.get_token_decimals.cache_clear()
+
+        def restore():
+            cm.SESSION, cm.get_w3, cm.get_api_key = saved
+            cm.get_contract.cache_clear()
+            cm.get_token_decimals.cache_clear()
+        return restore
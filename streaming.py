@@ -0,0 +1,113 @@
+"""
+Bounded-memory scoring of very large rounds.
+
+The day files are read in chunks and only per-author running state is kept:
+post and comment totals, and for the day being read the `limit` earliest
+comments of each author (the candidates for the per-day cap). Each chunk is
+merged into the candidates and cut back to `limit` per author, so memory
+depends on the chunk size and the number of authors, not on the size of the
+round. Upvotes are summed in whole units, as in scoring.py, so the results are
+exactly those of the in-memory scoring.
+"""
+import numpy as np
+import pandas as pd
+
+import scoring
+from compact import Authors, flair_codes, dates
+from round_store import iter_day
+
+
+# Rough size of a parsed day-file row, used to size the chunks from the memory ceiling.
+ROW_BYTES = 256
+
+
+class RunningTotals:
+    """Per-author integer sums over integer author ids, grown as new authors are interned."""
+
+    def __init__(self, columns):
+        self.arrays = {column: np.zeros(0, dtype=np.int64) for column in columns}
+
+    def add(self, column, ids, weights=None):
+        # Whole-number weights are summed exactly by bincount's float64 below 2**53.
+        counts = np.bincount(ids, weights=weights).astype(np.int64)
+        current = self.arrays[column]
+        if len(counts) > len(current):
+            current = np.concatenate([current, np.zeros(len(counts) - len(current), dtype=np.int64)])
+        current[:len(counts)] += counts
+        self.arrays[column] = current
+
+    def frame(self, authors):
+        n = len(authors)
+        return pd.DataFrame({column: np.pad(values, (0, n - len(values))) for column, values in self.arrays.items()},
+                            index=pd.Index(authors.names, name='author'))
+
+    @property
+    def nbytes(self):
+        return sum(values.nbytes for values in self.arrays.values())
+
+
+def earliest(candidates, limit):
+    """Keeps the first `limit` candidates of each author, ordered by date then by file position."""
+    order = np.lexsort((candidates['seq'], candidates['date'], candidates['author']))
+    author = candidates['author'][order]
+    start = np.ones(len(order), dtype=bool)
+    start[1:] = author[1:] != author[:-1]
+    first = np.maximum.accumulate(np.where(start, np.arange(len(order)), 0))
+    keep = order[np.arange(len(order)) - first < limit]
+    return {name: values[keep] for name, values in candidates.items()}
+
+
+def stream_round(days, limit=scoring.COMMENT_LIMIT, max_memory=256 * 2**20):
+    """
+    Per-author totals and pay2post counts of a round, reading the day files in chunks.
+
+    inputs:
+    days [dict]: day files, as returned by round_store.round_files
+    limit [int]: per-day comment cap
+    max_memory [int]: memory ceiling in bytes for the chunks and the running state
+    output: (totals [DataFrame] indexed by author with comments/comment_units/posts/post_units,
+             pay2post counts [DataFrame] with username/total_posts)
+    """
+    chunksize = max(1000, max_memory // (4 * ROW_BYTES))
+    authors = Authors()
+    totals = RunningTotals(['comments', 'comment_units', 'posts', 'post_units'])
+    pay2post = RunningTotals(['total_posts'])
+    weights = np.rint(np.array(list(scoring.FLAIR_WEIGHTS.values()) + [1]) * scoring.POST_UNITS).astype(np.int64)
+
+    for key in sorted(days):
+        files = days[key]
+
+        for chunk in iter_day(files.get('posts'), ['author', 'score', 'flair'], 'posts', chunksize):
+            ids = authors.intern(chunk['author'])
+            keep = ids >= 0
+            units = weights[flair_codes(chunk['flair'])] * (chunk['score'].to_numpy(dtype=np.int64) - 1)
+            totals.add('posts', ids[keep])
+            totals.add('post_units', ids[keep], units[keep])
+
+        # Comments, then daily-thread comments: seq keeps the file order for ties on the date.
+        candidates = {'author': np.empty(0, dtype=np.int32), 'date': np.empty(0, dtype=np.int64), 'seq': np.empty(0, dtype=np.int64), 'units': np.empty(0, dtype=np.int64)}
+        seq = 0
+        for kind in ('comments', 'daily'):
+            factor = scoring.DAILY_FACTOR if kind == 'daily' else 1
+            for chunk in iter_day(files.get(kind), ['author', 'score', 'date'], kind, chunksize):
+                ids = authors.intern(chunk['author'])
+                keep = ids >= 0
+                units = np.rint((chunk['score'].to_numpy(dtype=float) * factor - 1) * scoring.COMMENT_UNITS).astype(np.int64)
+                new = {'author': ids, 'date': dates(chunk['date']), 'seq': np.arange(seq, seq + len(chunk)), 'units': units}
+                seq += len(chunk)
+                candidates = earliest({name: np.concatenate([candidates[name], new[name][keep]]) for name in candidates}, limit)
+                state = sum(values.nbytes for values in candidates.values()) + totals.nbytes
+                if state > max_memory:
+                    raise MemoryError('Scoring day ' + key + ' needs ' + str(state) + ' bytes of running state, more than max_memory.')
+        totals.add('comments', candidates['author'])
+        totals.add('comment_units', candidates['author'], candidates['units'])
+
+        for chunk in iter_day(files.get('pay2post'), ['username'], 'pay2post', chunksize):
+            ids = authors.intern(chunk['username'])
+            pay2post.add('total_posts', ids[ids >= 0])
+
+    round_totals = totals.frame(authors)
+    round_totals = round_totals[(round_totals['comments'] > 0) | (round_totals['posts'] > 0)]
+    counts = pay2post.frame(authors)['total_posts']
+    counts = counts[counts > 0]
+    return round_totals, pd.DataFrame({'username': counts.index.to_numpy(dtype=object), 'total_posts': counts.to_numpy(dtype=int)})
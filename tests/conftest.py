@@ -0,0 +1,55 @@
+import os
+import shutil
+import sys
+
+import pytest
+
+# The modules live at the top of the repository, next to this directory.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from standins import SyntheticRound  # noqa: E402
+from round_store import day_key  # noqa: E402
+
+
+SIZES = {'users': 60, 'days': 2, 'posts': 10, 'comments': 200, 'daily': 100}
+
+
+class RoundOnDisk:
+    """A SyntheticRound with its day files and users.json written under `base`."""
+
+    def __init__(self, world, base, fmt='csv'):
+        self.world = world
+        self.base = base
+        self.dir = os.path.join(base, 'round')
+        world.write_round(self.dir, fmt)
+        self.users = world.users_json(os.path.join(base, 'users.json'))
+        self.key = day_key(world.days[0])
+
+    def registry(self):
+        from registry import WalletRegistry
+        return WalletRegistry(self.users, offline=True)
+
+    def copy(self, name):
+        """Copy of the day files in base/name, for a run that writes into its round directory."""
+        path = os.path.join(self.base, name)
+        shutil.copytree(self.dir, path)
+        return path
+
+    def generate(self, round_dir=None, **kwargs):
+        """Runs csv_generator on round_dir (the round itself by default) and returns the bytes of round_1.csv."""
+        from csv_generator import csv_generator
+        round_dir = round_dir or self.dir
+        csv_generator(round_dir, 1, self.registry(), **dict({'index': False, 'report': False}, **kwargs))
+        with open(os.path.join(round_dir, 'round_1.csv'), 'rb') as f:
+            return f.read()
+
+
+@pytest.fixture
+def synthetic_round(request, tmp_path):
+    """
+    A RoundOnDisk in tmp_path. Parametrise it indirectly with SyntheticRound sizes and an optional fmt, e.g.
+    @pytest.mark.parametrize('synthetic_round', [{'days': 3, 'fmt': 'parquet'}], indirect=True)
+    """
+    params = dict(SIZES, **getattr(request, 'param', {}))
+    fmt = params.pop('fmt', 'csv')
+    return RoundOnDisk(SyntheticRound(**params), str(tmp_path), fmt)
@@ -0,0 +1,58 @@
+import os
+
+import pytest
+
+import daily_harvest
+from standins import SyntheticRound, FakeMoreComments
+from daily_harvest import harvest_daily, checkpoint_paths
+from round_store import day_key, read_day
+
+
+def daily_thread():
+    # 200 comments come with the thread, the other 500 in five MoreComments.
+    world = SyntheticRound(users=60, days=1, posts=2, comments=10, daily=700)
+    key = day_key(world.days[0])
+    return world.reddit(), 'd' + key, key
+
+
+def fail_on_call(n, function):
+    calls = []
+
+    def failing(*args, **kwargs):
+        calls.append(1)
+        if len(calls) == n:
+            raise ConnectionError('connection reset')
+        return function(*args, **kwargs)
+    return failing
+
+
+@pytest.mark.parametrize('failure', ['request', 'checkpoint'])
+def test_resumed_harvest_matches_an_uninterrupted_one(failure, tmp_path, monkeypatch):
+    reddit, thread, key = daily_thread()
+    whole = str(tmp_path / 'whole')
+    os.makedirs(whole)
+    expected = harvest_daily(reddit, thread, whole, key, batch=2)
+
+    reddit, thread, key = daily_thread()
+    resumed = str(tmp_path / 'resumed')
+    os.makedirs(resumed)
+    if failure == 'request':
+        # The third morechildren request fails, in the middle of the second batch.
+        monkeypatch.setattr(FakeMoreComments, 'comments', fail_on_call(3, FakeMoreComments.comments))
+    else:
+        # The comments of the second batch are written, but the run dies before its checkpoint.
+        monkeypatch.setattr(daily_harvest.Harvest, 'save', fail_on_call(3, daily_harvest.Harvest.save))
+    with pytest.raises(ConnectionError):
+        harvest_daily(reddit, thread, resumed, key, batch=2, retries=0)
+    rows_path, state_path = checkpoint_paths(resumed, key)
+    assert os.path.exists(rows_path) and os.path.exists(state_path)
+
+    # The next run restores the saved MoreComments and the comments already written.
+    monkeypatch.undo()
+    assert harvest_daily(reddit, thread, resumed, key, batch=2) == expected
+
+    whole_daily = read_day(os.path.join(whole, 'daily_' + key + '.csv'))
+    resumed_daily = read_day(os.path.join(resumed, 'daily_' + key + '.csv'))
+    assert resumed_daily['id'].is_unique
+    assert resumed_daily.sort_values('id', ignore_index=True).equals(whole_daily.sort_values('id', ignore_index=True))
+    assert not os.path.exists(rows_path) and not os.path.exists(state_path)
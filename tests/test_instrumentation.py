@@ -0,0 +1,19 @@
+import sys
+
+import pytest
+
+import instrumentation
+from csv_generator import csv_generator
+
+
+class BrokenRegistry:
+    def registered(self, users):
+        raise RuntimeError('users.json unavailable')
+
+
+def test_failed_run_ends_its_report(synthetic_round):
+    with pytest.raises(RuntimeError):
+        csv_generator(synthetic_round.dir, 1, BrokenRegistry(), index=False, profile=True)
+    # Later calls of the thread are not recorded into the failed run, and its profiler is stopped.
+    assert instrumentation.active() is None
+    assert sys.getprofile() is None
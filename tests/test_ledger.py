@@ -0,0 +1,52 @@
+
+import pytest
+
+import compute_multiplier as cm
+from ledger import Ledger
+from standins import SyntheticChain
+
+WALLETS = ['0x%040x' % (i + 1) for i in range(12)]
+
+
+@pytest.fixture
+def chain():
+    chain = SyntheticChain(WALLETS, transfers=40)
+    restore = chain.install()
+    yield chain
+    restore()
+
+
+def nft_contracts(chain):
+    return sorted({tx['contractAddress'] for tx in chain.tokennfttx})
+
+
+def test_sync_needs_the_membership_contracts(chain, tmp_path):
+    ledger = Ledger(str(tmp_path / 'ledger.sqlite'))
+    with pytest.raises(ValueError):
+        ledger.sync([])
+    ledger.sync_tokens()
+    # Without synced mints every membership would silently be 0.
+    with pytest.raises(ValueError):
+        ledger.multipliers(WALLETS)
+
+
+def test_amounts_are_exact(chain, tmp_path):
+    ledger = Ledger(str(tmp_path / 'ledger.sqlite'))
+    ledger.sync(nft_contracts(chain))
+
+    stored = ledger.db.execute('SELECT value FROM token_transfers').fetchall()
+    assert sorted(int(v) for v, in stored) == sorted(int(tx['value']) for tx in chain.tokentx)
+    figures = ledger.figures()
+    for wallet in WALLETS:
+        assert figures.loc[wallet, 'current_wallet_balance'] == chain.balances[wallet] / 10 ** 18
+
+
+def test_multipliers_match_get_multipliers(chain, tmp_path):
+    ledger = Ledger(str(tmp_path / 'ledger.sqlite'))
+    ledger.sync(nft_contracts(chain))
+
+    ours = ledger.multipliers(WALLETS).set_index('blockchain_address')
+    theirs = cm.get_multipliers(WALLETS).set_index('blockchain_address')
+    for column in ('earned', 'sent_to_lp', 'membership'):
+        assert ours[column].tolist() == theirs[column].tolist()
+    assert (ours['membership'] > 0).any()
@@ -0,0 +1,104 @@
+import os
+
+import pandas as pd
+import pytest
+
+from round_store import day_key, read_day
+
+
+@pytest.fixture
+def world(synthetic_round):
+    return synthetic_round.world
+
+
+def connect_to(world):
+    return lambda budget: world.reddit()
+
+
+def test_csv_miner_matches_the_listing(synthetic_round, tmp_path):
+    from csv_miner import csv_miner
+
+    world, key = synthetic_round.world, synthetic_round.key
+    wdir = str(tmp_path) + '/'
+    os.makedirs(wdir + '1')
+    csv_miner(wdir, 'ethtrader', 1, 0, 2, connect=connect_to(world))
+
+    for kind in ('posts', 'comments', 'daily'):
+        mined = read_day(os.path.join(wdir + '1', kind + '_' + key + '.csv'))
+        expected = read_day(os.path.join(synthetic_round.dir, kind + '_' + key + '.csv'))
+        assert sorted(mined['id']) == sorted(expected['id'])
+        assert mined['score'].sum() == expected['score'].sum()
+    assert os.path.exists(os.path.join(wdir + '1', 'aggregate_' + key + '.csv'))
+
+
+def test_csv_miner_without_daily_thread(world, tmp_path):
+    from csv_miner import csv_miner
+
+    reddit = world.reddit()
+    reddit.submissions = [s for s in reddit.submissions if s.author != 'AutoModerator']
+    wdir = str(tmp_path) + '/'
+    os.makedirs(wdir + '1')
+    csv_miner(wdir, 'ethtrader', 1, 0, 2, connect=connect_to(world))
+
+    daily = read_day(os.path.join(wdir + '1', 'daily_' + day_key(world.days[0]) + '.csv'))
+    assert len(daily) == 0
+
+
+def test_mine_subs_shares_one_budget(world, tmp_path):
+    from multi_miner import mine_subs, sub_round_dir
+    from reddit_scheduler import RateBudget
+
+    budget = RateBudget(rate=1000, burst=1000)
+    errors = mine_subs(str(tmp_path), ['ethtrader', 'cryptocurrency'], 1, 0, 2, workers=2, budget=budget, connect=connect_to(world))
+
+    assert errors == {'ethtrader': None, 'cryptocurrency': None}
+    key = day_key(world.days[0])
+    for sub in ('ethtrader', 'cryptocurrency'):
+        assert os.path.exists(os.path.join(sub_round_dir(str(tmp_path), sub, 1), 'aggregate_' + key + '.csv'))
+
+
+def test_pay2post_daily_and_incremental(world, tmp_path):
+    from pay2post import pay2post
+    from mentions import read_mark
+
+    wdir = str(tmp_path) + '/'
+    os.makedirs(wdir + '1')
+    pay2post(wdir, 1, connect=connect_to(world))
+    yesterday = world.days[-1]
+    path = os.path.join(wdir + '1', 'pay2post_' + day_key(yesterday) + '.csv')
+    expected = [m.submission.id for m in world.reddit().mentions if m.submission.created_utc >= yesterday.timestamp()]
+    assert sorted(read_day(path)['id']) == sorted(expected)
+
+    # The first incremental run finds the same mentions already in the day file.
+    pay2post(wdir, 1, incremental=True, connect=connect_to(world))
+    assert read_mark(wdir)['id'] == world.reddit().mentions[0].id
+    assert len(pd.read_csv(path)) == len(expected)
+
+
+def test_daily_pipeline_matches_csv_miner(world, tmp_path):
+    from csv_miner import csv_miner
+    from daily_pipeline import daily_pipeline
+
+    miner, pipeline = str(tmp_path / 'miner') + '/', str(tmp_path / 'pipeline') + '/'
+    os.makedirs(miner + '1')
+    csv_miner(miner, 'ethtrader', 1, 0, 2, connect=connect_to(world))
+    counts = daily_pipeline(world.reddit(), pipeline, 'ethtrader', 1, 0, 2)
+
+    key = day_key(world.days[0])
+    for kind in ('posts', 'comments', 'daily'):
+        mined = read_day(os.path.join(miner + '1', kind + '_' + key + '.csv')).sort_values('id', ignore_index=True)
+        piped = read_day(os.path.join(pipeline + '1', kind + '_' + key + '.csv')).sort_values('id', ignore_index=True)
+        assert len(piped) == counts[kind]
+        pd.testing.assert_frame_equal(mined.drop(columns='Unnamed: 0'), piped.drop(columns='Unnamed: 0'))
+
+
+def test_pay2post_needs_its_own_praw_section(tmp_path, monkeypatch):
+    import configparser
+    from pay2post import pay2post
+
+    # Only the miners' DEFAULT credentials: pay2post must not read that account's inbox.
+    (tmp_path / 'praw.ini').write_text('[DEFAULT]\nclient_id=x\nclient_secret=y\nuser_agent=z\n')
+    monkeypatch.chdir(tmp_path)
+    os.makedirs(str(tmp_path / '1'))
+    with pytest.raises(configparser.NoSectionError):
+        pay2post(str(tmp_path) + '/', 1)
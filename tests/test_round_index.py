@@ -0,0 +1,23 @@
+import sqlite3
+
+import pytest
+
+from round_index import index_path, update_index
+
+
+def index_tables(round_dir):
+    db = sqlite3.connect(index_path(round_dir))
+    tables = {table: sorted(db.execute('SELECT * FROM ' + table)) for table in ('posts', 'comments', 'pay2post', 'days')}
+    db.close()
+    return tables
+
+
+@pytest.mark.parametrize('synthetic_round', [{'users': 80, 'days': 3, 'posts': 20, 'comments': 500, 'daily': 300}], indirect=True)
+@pytest.mark.parametrize('workers', [1, 2])
+def test_index_from_scored_days_matches_reading_the_files(synthetic_round, workers):
+    scored, read = synthetic_round.copy('scored'), synthetic_round.copy('read')
+
+    synthetic_round.generate(scored, index=True, workers=workers)
+    assert update_index(read, workers=workers) == 3
+    assert index_tables(scored) == index_tables(read)
+    assert update_index(scored) == 0
@@ -0,0 +1,46 @@
+import os
+
+import pandas as pd
+import pytest
+
+from round_store import SCHEMAS, read_day, write_day
+
+pytest.importorskip('pyarrow')
+
+
+@pytest.mark.parametrize('kind', sorted(SCHEMAS))
+def test_empty_parquet_day(kind, tmp_path):
+    # The miners write pd.DataFrame([]) for a day without e.g. a daily thread.
+    path = write_day(pd.DataFrame([]), str(tmp_path), kind, '2024111', 'parquet')
+
+    df = read_day(path, ['author' if kind != 'pay2post' else 'username', 'id'])
+    assert len(df) == 0
+    assert list(read_day(path).columns) == list(SCHEMAS[kind])
+
+
+def test_parquet_without_a_requested_column(tmp_path):
+    path = str(tmp_path / 'posts_2024111.parquet')
+    pd.DataFrame({'id': ['a'], 'author': ['x'], 'score': [3]}).to_parquet(path, index=False)
+
+    df = read_day(path, ['author', 'score', 'flair'])
+    assert list(df.columns) == ['author', 'score', 'flair']
+    assert df['flair'].isna().all()
+
+
+@pytest.mark.parametrize('synthetic_round', [{'fmt': 'parquet'}], indirect=True)
+def test_round_with_an_empty_parquet_day(synthetic_round):
+    write_day(pd.DataFrame([]), synthetic_round.dir, 'daily', synthetic_round.key, 'parquet')
+
+    synthetic_round.generate()
+    assert len(pd.read_csv(os.path.join(synthetic_round.dir, 'round_1.csv'))) > 0
+
+
+@pytest.mark.parametrize('kind', ['comments', 'daily'])
+def test_round_with_a_header_only_csv_day(kind, synthetic_round):
+    # The old miners wrote an empty day with pd.DataFrame([]).to_csv, a file without columns.
+    round_dir, key = synthetic_round.dir, synthetic_round.key
+    pd.DataFrame([]).to_csv(os.path.join(round_dir, kind + '_' + key + '.csv'))
+
+    synthetic_round.generate()
+    assert len(pd.read_csv(os.path.join(round_dir, 'round_1.csv'))) > 0
+    assert len(pd.read_csv(os.path.join(round_dir, kind + '_' + key + '_limited.csv'))) == 0
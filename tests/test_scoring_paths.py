@@ -0,0 +1,21 @@
+import pytest
+
+
+# More comments per day than a chunk of the streaming path, so a day is read in several chunks, and enough
+# posts per author for float sums of the flair-weighted upvotes to depend on the order they are added in.
+pytestmark = pytest.mark.parametrize('synthetic_round', [{'users': 150, 'days': 3, 'posts': 200, 'comments': 3000, 'daily': 1500}], indirect=True)
+
+
+def test_streaming_matches_day_aggregates(synthetic_round):
+    r = synthetic_round
+    assert r.generate(r.copy('streaming'), max_memory=2**20) == r.generate(r.copy('aggregates'))
+
+
+def test_workers_match_one_process(synthetic_round):
+    r = synthetic_round
+    assert r.generate(r.copy('workers'), workers=2) == r.generate(r.copy('aggregates'))
+
+
+def test_compact_matches_day_aggregates(synthetic_round):
+    r = synthetic_round
+    assert r.generate(r.copy('compact'), compact=True) == r.generate(r.copy('aggregates'))
@@ -0,0 +1,88 @@
+import pytest
+
+import compute_multiplier as cm
+from standins import SyntheticChain
+from transfer_cache import TransferCache
+
+WALLETS = ['0x%040x' % (i + 1) for i in range(8)]
+
+
+@pytest.fixture
+def chain():
+    chain = SyntheticChain(WALLETS, transfers=30)
+    restore = chain.install()
+    yield chain
+    restore()
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return TransferCache(str(tmp_path / 'transfers.sqlite'), fetch=cm.fetch_transfers)
+
+
+def cached_rows(cache, wallet):
+    return cache.db.execute('SELECT COUNT(*) FROM transfers WHERE address = ?', (wallet,)).fetchone()[0]
+
+
+def add_transfer(chain, wallet, block):
+    tx = dict(chain.tokentx[-1], blockNumber=str(block), hash='0xnew%d' % block, **{'from': cm.ORIGIN_WALLET, 'to': wallet})
+    chain.tokentx.append(tx)
+    chain.index.clear()
+    return tx
+
+
+def test_sync_only_fetches_new_blocks(chain, cache):
+    wallet = WALLETS[0]
+    startblocks = []
+    fetch = cache.fetch
+    cache.fetch = lambda *args, startblock=0: startblocks.append(startblock) or fetch(*args, startblock=startblock)
+
+    first = cache.sync(wallet, 'tokentx', cm.TOKEN_CONTRACT)
+    assert first == len(chain.by_address('tokentx', wallet)) > 0
+    last = cache.last_block(wallet, 'tokentx', cm.TOKEN_CONTRACT)
+
+    assert cache.sync(wallet, 'tokentx', cm.TOKEN_CONTRACT) == 0
+    add_transfer(chain, wallet, last + 10)
+    assert cache.sync(wallet, 'tokentx', cm.TOKEN_CONTRACT) == 1
+    assert startblocks == [0, last + 1, last + 1]
+    assert cache.last_block(wallet, 'tokentx', cm.TOKEN_CONTRACT) == last + 10
+    assert cached_rows(cache, wallet) == first + 1
+
+
+def test_equal_transfers_of_one_transaction_are_kept(chain, cache):
+    # tokentx rows carry no log index, so two equal transfers of one transaction have the same payload.
+    wallet = WALLETS[1]
+    i = max(i for i, tx in enumerate(chain.tokentx) if tx['from'] == cm.ORIGIN_WALLET and tx['to'] == wallet)
+    chain.tokentx.insert(i + 1, dict(chain.tokentx[i]))
+    chain.index.clear()
+
+    uncached = cm.get_multiplier(wallet)
+    assert cm.get_multiplier(wallet, cache) == uncached
+    assert cache.transfers(wallet, 'tokentx', cm.TOKEN_CONTRACT) == chain.by_address('tokentx', wallet)
+
+
+def test_cached_multipliers_match_uncached(chain, cache):
+    for wallet in WALLETS:
+        uncached = cm.get_multiplier(wallet)
+        assert cm.get_multiplier(wallet, cache) == uncached
+        # The second, warm lookup only asks for the blocks after the cached ones.
+        assert cm.get_multiplier(wallet, cache) == uncached
+
+
+def test_offline_multipliers(chain, cache):
+    # The offline wallet balance comes from the cached transfers, so only wallets whose
+    # synthetic history never goes negative can match the RPC balance.
+    wallets = [w for w in WALLETS if chain.balances[w] >= 0]
+    expected = {wallet: cm.get_multiplier(wallet, cache) for wallet in wallets}
+
+    calls = sum(chain.calls.values())
+    for wallet in wallets:
+        assert cm.get_multiplier(wallet, cache, offline=True) == pytest.approx(expected[wallet], rel=1e-12)
+    assert sum(chain.calls.values()) == calls
+
+
+def test_offline_needs_a_synced_wallet(chain, cache):
+    with pytest.raises(LookupError):
+        cm.get_multiplier(WALLETS[0], cache, offline=True)
+    with pytest.raises(ValueError):
+        cm.get_multiplier(WALLETS[0], offline=True)
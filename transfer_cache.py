@@ -0,0 +1,102 @@
+"""
+Local, incrementally synced cache of Etherscan transfers.
+
+Token (tokentx) and NFT (tokennfttx) transfers are stored per address in a
+SQLite file, keyed by block number. A sync only asks Etherscan for the blocks
+after the last cached one, so after the first sync of a wallet its history
+costs one small query. Balances read over RPC are stored too, which lets
+compute_multiplier.get_multiplier run offline from the cache alone.
+"""
+import json
+import sqlite3
+import time
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS transfers (
+    address TEXT NOT NULL,
+    query TEXT NOT NULL,
+    block INTEGER NOT NULL,
+    payload TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS transfers_by_address ON transfers (address, query, block);
+CREATE TABLE IF NOT EXISTS synced (
+    address TEXT NOT NULL,
+    query TEXT NOT NULL,
+    last_block INTEGER NOT NULL,
+    synced_at REAL NOT NULL,
+    PRIMARY KEY (address, query)
+);
+CREATE TABLE IF NOT EXISTS balances (
+    address TEXT NOT NULL,
+    token TEXT NOT NULL,
+    balance TEXT NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (address, token)
+);
+"""
+
+
+def query_key(action, contract_address=None):
+    return action + ':' + (contract_address or '').lower()
+
+
+class TransferCache:
+    """
+    SQLite cache of the transfer histories of wallets.
+
+    inputs:
+    path [str]: SQLite file, created if missing
+    fetch [function]: fetch(address, action, contract_address, startblock=...) returning
+                      a list of Etherscan transfer dicts, e.g. compute_multiplier.fetch_transfers
+    """
+
+    def __init__(self, path='transfers.sqlite', fetch=None):
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.executescript(SCHEMA)
+        self.fetch = fetch
+
+    def last_block(self, address, action, contract_address=None):
+        row = self.db.execute('SELECT last_block FROM synced WHERE address = ? AND query = ?', (address.lower(), query_key(action, contract_address))).fetchone()
+        return None if row is None else row[0]
+
+    def sync(self, address, action='tokentx', contract_address=None):
+        """Fetches the transfers after the last cached block and stores them. Returns the number of new transfers."""
+        last = self.last_block(address, action, contract_address)
+        startblock = 0 if last is None else last + 1
+        new = self.fetch(address, action, contract_address, startblock=startblock)
+        key = query_key(action, contract_address)
+        with self.db:
+            self.db.executemany(
+                'INSERT INTO transfers (address, query, block, payload) VALUES (?, ?, ?, ?)',
+                [(address.lower(), key, int(tx['blockNumber']), json.dumps(tx)) for tx in new])
+            last = max([int(tx['blockNumber']) for tx in new], default=-1 if last is None else last)
+            self.db.execute('INSERT OR REPLACE INTO synced (address, query, last_block, synced_at) VALUES (?, ?, ?, ?)', (address.lower(), key, last, time.time()))
+        return len(new)
+
+    def transfers(self, address, action='tokentx', contract_address=None):
+        """Cached transfers of an address, oldest first."""
+        rows = self.db.execute(
+            'SELECT payload FROM transfers WHERE address = ? AND query = ? ORDER BY block, rowid',
+            (address.lower(), query_key(action, contract_address)))
+        return [json.loads(payload) for payload, in rows]
+
+    def get(self, address, action='tokentx', contract_address=None, offline=False):
+        """Transfers of an address, synced first unless offline."""
+        if offline:
+            if self.last_block(address, action, contract_address) is None:
+                raise LookupError(f"{address} has never been synced for {action}")
+        else:
+            self.sync(address, action, contract_address)
+        return self.transfers(address, action, contract_address)
+
+    def store_balance(self, address, token, balance):
+        with self.db:
+            self.db.execute('INSERT OR REPLACE INTO balances (address, token, balance, updated_at) VALUES (?, ?, ?, ?)', (address.lower(), token.lower(), repr(balance), time.time()))
+
+    def balance(self, address, token):
+        """Last balance stored for an address."""
+        row = self.db.execute('SELECT balance FROM balances WHERE address = ? AND token = ?', (address.lower(), token.lower())).fetchone()
+        if row is None:
+            raise LookupError(f"No cached balance of {token} for {address}")
+        return float(row[0])